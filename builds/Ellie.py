@@ -1,7 +1,24 @@
-from maya import cmds as mc
-from BFX_masterclass.utils import pipeline, control
-from BFX_masterclass import legModule, static
 import sys
+import os
+
+sys.path.append(r'C:/Users/{}/Documents/maya/projects/BFX_masterclass/CHR_Ellie/scripts'.format(os.environ.get('USERNAME')))
+
+
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+from BFX_masterclass.utils import pipeline, controls, maths, optimize
+from BFX_masterclass.utils.graph import BuildGraph
+from BFX_masterclass import legModule, static
+
+ASSET = 'CHR_Ellie'
+SIDES = 'LR'
+IK_SOLVER = 'ikHandle'
+# 'proxy' skips the ribbon for animation, switch each leg with leg.set_level('full') for render/playblast
+LEVEL = 'full'
+# Spans of the generated leg ribbon surface, None uses the modeled *_legSurface00_NRB from the components file
+LEG_SURFACE_SPANS = 4
+BIND_GUIDES = ['L_legBind00_LOC', 'L_legBind01_LOC', 'L_legBind02_LOC', 'L_legBind03_LOC', 'L_legBind04_LOC',
+    'L_legBind05_LOC', 'L_legBind06_LOC', 'L_legBind07_LOC', 'L_legBind08_LOC', 'L_legBind09_LOC']
 
 def flush_python_cache():
 
@@ -12,23 +29,82 @@ def flush_python_cache():
                 print(v.__file__)
                 del sys.modules[k]
 
+#- Build stages
+###########################################################################
+
+def build_root(scene):
+    '''
+    Create a COG control
+    '''
+    root = controls.add('C_root00_JNT', 'C_root00', parent=static.ctlGroup, shapeName='root')
+    controls.scale_control(root.trn, 2)
+    return root
+
+def read_leg_guides(scene):
+    '''
+    Reading all the leg guide positions we need for the precompute stages in one go
+    '''
+    guides = {}
+    for s in SIDES:
+        hip = s+'_leg00_JNT'
+        chain = sorted(mc.listRelatives(hip, ad=1))
+        guides[s] = {key: mc.xform(guide, q=1, ws=1, t=1) for key, guide in zip(['hip', 'knee', 'ankle'], [hip, chain[0], chain[1]])}
+    return guides
+
+def leg_precompute(guides, side):
+    '''
+    Pure maths for one leg, this stage runs in the thread pool
+    '''
+    legGuides = guides[side]
+    return {
+        'poleVectorPosition': maths.pole_vector_position(legGuides['hip'], legGuides['knee'], legGuides['ankle']),
+    }
+
+def build_leg(root, precompute, side):
+    return legModule.LegModule(name=side+'_leg', parent=root.trn, legGuides=side+'_leg00_JNT',
+        poleVectorPosition=precompute['poleVectorPosition'], ikSolver=IK_SOLVER, level=LEVEL)
+
+def build_leg_surface(leg, side):
+    jntGuides = [side+elem[1:] for elem in BIND_GUIDES]
+    surface = side+'_legSurface00_NRB'
+    if LEG_SURFACE_SPANS:
+        # We generate the surface, the modeled one isn't needed anymore
+        if mc.objExists(surface):
+            mc.delete(surface)
+        leg.build_leg_surface(surface=None, jntGuides=jntGuides, spans=LEG_SURFACE_SPANS)
+    else:
+        leg.build_leg_surface(surface=surface, jntGuides=jntGuides)
+    return leg
+
+def build_foot_roll(leg, side):
+    leg.foot_Roll(side+'_footGuides00_GRP')
+    return leg
+
+#- Build description
+###########################################################################
+
+BUILD = [
+    {'name': 'scene', 'function': pipeline.build_rig_scene, 'parameters': {'assetName': ASSET}},
+    {'name': 'root', 'function': build_root, 'dependencies': ['scene']},
+    {'name': 'legGuides', 'function': read_leg_guides, 'dependencies': ['scene']},
+]
+for s in SIDES:
+    BUILD += [
+        {'name': s+'_legPrecompute', 'function': leg_precompute, 'dependencies': ['legGuides'], 'compute': True, 'parameters': {'side': s}},
+        {'name': s+'_leg', 'function': build_leg, 'dependencies': ['root', s+'_legPrecompute'], 'parameters': {'side': s}},
+        {'name': s+'_legSurface', 'function': build_leg_surface, 'dependencies': [s+'_leg'], 'parameters': {'side': s}},
+        {'name': s+'_footRoll', 'function': build_foot_roll, 'dependencies': [s+'_legSurface'], 'parameters': {'side': s}},
+    ]
+
+#- Removing duplicate work left behind by the modules, once they are all built
+BUILD.append({'name': 'optimize', 'function': lambda *legs: optimize.optimize_rig(), 'dependencies': [s+'_footRoll' for s in SIDES]})
+
 if __name__ == '__main__':
 
+    #- Flushing python cache
     flush_python_cache()
-    pipeline.build_rig_scene('CHR_Ellie')
-
-    # Create a COG control
-    root = control.add_control('C_root00_JNT', 'C_root00', parent=static.ctlGroup, shapeName='root')
-    control.scale_control(root.trn, 2)
-
-    # Creating Leg
-    for s in 'LR':
-            
-        leg = legModule.LegModule(name=s+'_leg', parent=root.trn, legGuides=s+'_leg00_JNT')
-        leg.build_leg_surface(surface=s+'_legSurface00_NRB', 
-            jntGuides= [s+elem[1:] for elem in['L_legBind00_LOC', 'L_legBind01_LOC', 
-            'L_legBind02_LOC', 'L_legBind03_LOC', 'L_legBind04_LOC', 'L_legBind05_LOC', 'L_legBind06_LOC', 
-            'L_legBind07_LOC', 'L_legBind08_LOC', 'L_legBind09_LOC']])
-        leg.footRoll(s+'_footGuides00_GRP')
-    
-    
\ No newline at end of file
+
+    #- Build rig
+    graph = BuildGraph.from_description(BUILD)
+    graph.run()
+    print(graph.report())
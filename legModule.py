@@ -1,12 +1,20 @@
-from maya import cmds as mc
-from maya.api import OpenMaya as om
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+om = LazyModule('maya.api.OpenMaya')
 
 from collections import OrderedDict
+from contextlib import contextmanager
 import logging
+import random
+import time
+
+import numpy as np
 
 from BFX_masterclass.utils import controls as ctlFn
 from BFX_masterclass.utils import functions as fn
-from BFX_masterclass import static
+from BFX_masterclass.utils import maths
+from BFX_masterclass.utils import profiling
+from BFX_masterclass import plugins, static
 
 class LegModule:
 
@@ -21,10 +29,40 @@ class LegModule:
     parent      : str : hook under which we are parenting our leg
     legGuides  : str : name of the first joint in the leg chain. We will
                         extract the hip, knee, ankle and toe control from these components
+    poleVectorPosition : list : optional pole vector position, if it has already been calculated
+                        with maths.pole_vector_position() (e.g. in a build graph compute stage)
+    ikSolver    : str : 'ikHandle' builds an ikHandle, pole vector constraint and stretch network,
+                        'analytic' drives the chain with a single bfxTwoBoneIK node (see plugins/twoBoneIK.py)
+    level       : str : 'full' builds the ribbon leg surface, 'proxy' skips it and binds the bind joints
+                        straight to the IK chain for lighter animation. Switch with set_level()
+
+    The module remembers the guide positions it was built from (self.guides) and which parts of the rig
+    depend on them, so an edited guide can be pushed to the built rig with update_guides() without a rebuild.
 
     '''
-    def __init__(self, name, parent, legGuides):
+    # Parts of the rig we recompute when a guide changes
+    GUIDE_DEPENDENCIES = {
+        'knee'      : ['poleVector', 'stretch'],
+        'Heel'      : ['footPivots'],
+        'FootTip'   : ['footPivots'],
+        'ToeTip'    : ['footPivots'],
+        'Tarsal'    : ['footPivots'],
+    }
+
+    # Guides the hip and ankle controls (and everything under them) were built at, moving them needs a rebuild
+    REBUILD_GUIDES = ['hip', 'ankle']
+
+    IK_SOLVERS = ['ikHandle', 'analytic']
+    LEVELS = ['proxy', 'full']
+
+    def __init__(self, name, parent, legGuides, poleVectorPosition=None, ikSolver='ikHandle', level='full'):
         logging.info('Initializing Leg Module')
+        if ikSolver not in self.IK_SOLVERS:
+            mc.error('Unknown IK solver "{}", use one of {}'.format(ikSolver, self.IK_SOLVERS))
+        if level not in self.LEVELS:
+            mc.error('Unknown build level "{}", use one of {}'.format(level, self.LEVELS))
+        self.ikSolver=ikSolver
+        self.level=level
         self.name=name
         self.side=name[0]
         self.parent=parent
@@ -37,6 +75,11 @@ class LegModule:
         self.toesGuide = legGuides[2]
         self.toeEndGuide = legGuides[3]
 
+        # Remembering where our guides were when we built the module
+        self.guides = OrderedDict()
+        for key, guide in zip(['hip', 'knee', 'ankle'], [self.hipGuide, self.kneeGuide, self.ankleGuide]):
+            self.guides[key] = mc.xform(guide, q=1, ws=1, t=1)
+
         # Un-parent toe guide from ankle
         mc.parent(self.toesGuide, w=1)
     
@@ -66,23 +109,48 @@ class LegModule:
 
         # Build Leg IK
         mc.parent(self.hipGuide, hipCtl.trn)
-        ikHandle = mc.ikHandle(self.hipGuide, ee=self.ankleGuide, name=self.name+'_IKH')[0]
-        mc.parent(ikHandle, ankleCtl.jnt)
-
-        # Pole Vector
-        poleVectCtl = self.build_pole_vector_control(self.hipGuide, self.kneeGuide, self.ankleGuide)
-        mc.poleVectorConstraint(poleVectCtl.trn, ikHandle)
-
-        # Stretch
-        self.stretch_IK(hipCtl.jnt, ankleCtl.jnt)
+        self.ikHandle = None
+        if ikSolver == 'analytic':
+            # Pole Vector
+            poleVectCtl = self.build_pole_vector_control(self.hipGuide, self.kneeGuide, self.ankleGuide, position=poleVectorPosition)
+
+            # IK solve and stretch in one node
+            self.build_analytic_IK(hipCtl.jnt, ankleCtl.jnt, poleVectCtl.trn)
+        else:
+            ikHandle = mc.ikHandle(self.hipGuide, ee=self.ankleGuide, name=self.name+'_IKH')[0]
+            mc.parent(ikHandle, ankleCtl.jnt)
+            self.ikHandle = ikHandle
+
+            # Pole Vector
+            poleVectCtl = self.build_pole_vector_control(self.hipGuide, self.kneeGuide, self.ankleGuide, position=poleVectorPosition)
+            mc.poleVectorConstraint(poleVectCtl.trn, ikHandle)
+
+            # Stretch
+            self.stretch_IK(hipCtl.jnt, ankleCtl.jnt)
+        self.poleVectorCtl = poleVectCtl
 
         # Store values
         self.ankleCtl = ankleCtl
         self.hipCtl = hipCtl
         self.toeCtl = toeCtl
-
-
-    def build_pole_vector_control(self, hip, knee, ankle):
+        self.ikJoints = [self.hipGuide, self.kneeGuide, self.ankleGuide]
+        self.bindJoints = []
+        self.bindJointGuides = OrderedDict()
+        self.surface = None
+        self.surfaceControls = None
+        # DG nodes of the ribbon set-up (skinCluster, constraints, twist nodes), frozen at the proxy level
+        self.ribbonNetwork = []
+        self.footRollNetwork = []
+        self.rivets = OrderedDict()
+        self.footPivots = OrderedDict()
+
+        # Proxy level
+        self.proxyConstraints = []
+        self.__deferredSurface = None
+        self.__rivetInputs = {}
+
+
+    def build_pole_vector_control(self, hip, knee, ankle, position=None):
         '''
         This function will create the pole vector control.
          
@@ -98,30 +166,22 @@ class LegModule:
         hip     : str : name to hip guide
         knee    : str : name to knee guide 
         ankle   : str : name to ankle guide 
+        position: list : pre-calculated pole vector position. When provided we skip step 1
 
         Returns
         -------
         ctl: controlStruct
 
         '''
-        hipPosition = om.MVector(*mc.xform(hip, ws=1, q=1, t=1))
-        kneePosition = om.MVector(*mc.xform(knee, ws=1, q=1, t=1))
-        anklePosition = om.MVector(*mc.xform(ankle, ws=1, q=1, t=1))
-
-        # Vectors
         # Calculating the position of the pole vector 
         # We will project the vector between the hip and knee onto the vector between the hip and ankle. 
         # The pole vector will have the same length as the hip-knee vector and it will be along the vector between the knee projection and knee
-        hipAnkleVector = anklePosition - hipPosition
-        hipKneeVector = kneePosition - anklePosition
-        kneeProjectionLength = (hipAnkleVector*hipKneeVector)/hipAnkleVector.length()
-        kneeProjectionVector = hipAnkleVector.normal()*kneeProjectionLength
-
-        poleVectorDirection = (hipKneeVector - kneeProjectionVector).normal()
+        pos = position
+        if pos is None:
+            pos = maths.pole_vector_position(*[mc.xform(guide, ws=1, q=1, t=1) for guide in [hip, knee, ankle]])
 
         poleGuide = mc.createNode('transform')
-        pos = kneePosition+(poleVectorDirection*hipKneeVector.length())
-        mc.xform(poleGuide, ws=1, t=[pos.x, pos.y, pos.z])
+        mc.xform(poleGuide, ws=1, t=pos)
 
         # Building the control
         pole_vect_ctl = ctlFn.add(poleGuide, self.name+'PoleVector', static.rigGroup, shapeName='locator')
@@ -180,6 +240,67 @@ class LegModule:
         mc.setAttr(lowerLegStretch+'.input2', mc.getAttr(self.ankleGuide+'.translateX'))
         mc.connectAttr(lowerLegStretch+'.output', self.ankleGuide+'.translateX')
 
+        # Storing the plugs holding our rest lengths
+        self.restLengthPlugs = {'distance': legRatio+'.input2', 'upper': upperLegStretch+'.input2', 'lower': lowerLegStretch+'.input2'}
+        self.stretchNetwork = [legLen, legRatio, max, globalLegLen, upperLegStretch, lowerLegStretch]
+
+    def build_analytic_IK(self, hipCtl, ankleCtl, poleCtl):
+        '''
+        Driving the hip, knee and ankle joints with a single bfxTwoBoneIK node.
+        It does the same work as the ikHandle, the pole vector constraint and the stretch_IK() network, in one compute:
+            knee.tX = masterWalk.scaleY * max(lengthRatio, 1) * knee.tX(in bind pose)
+            ankle.tX = masterWalk.scaleY * max(lengthRatio, 1) * ankle.tX(in bind pose)
+            hip.rotate, knee.rotate = analytic two bone solve in the plane of the hip, ankle and pole vector
+
+        We store the orientation of the joints relative to the IK plane in the bind pose, so the joints keep it while solving
+
+        Parameters
+        ----------
+        hipCtl      : str : transform at the root of the chain
+        ankleCtl    : str : transform the chain is reaching for
+        poleCtl     : str : pole vector control
+
+        Returns
+        -------
+        ikNode : str
+        '''
+        plugins.load('twoBoneIK')
+        ikNode = mc.createNode('bfxTwoBoneIK', name=self.name+'_IKS')
+
+        # Rest pose
+        hipPosition, kneePosition, anklePosition = [mc.xform(jnt, q=1, ws=1, t=1) for jnt in [self.hipGuide, self.kneeGuide, self.ankleGuide]]
+        _, hipFrame, kneeFrame = maths.two_bone_ik(hipPosition, anklePosition, mc.xform(poleCtl, q=1, ws=1, t=1),
+            maths.distance(hipPosition, kneePosition), maths.distance(kneePosition, anklePosition))
+        for jnt, frame, attribute in [(self.hipGuide, hipFrame, 'hipOffset'), (self.kneeGuide, kneeFrame, 'kneeOffset')]:
+            restMatrix = np.array(mc.xform(jnt, q=1, ws=1, m=1)).reshape(4, 4)
+            offset = np.identity(4)
+            offset[:3, :3] = (restMatrix[:3, :3]/np.linalg.norm(restMatrix[:3, :3], axis=1)[:, None]) @ frame.T
+            mc.setAttr(ikNode+'.'+attribute, *offset.flatten().tolist(), type='matrix')
+
+        mc.setAttr(ikNode+'.upperLength', mc.getAttr(self.kneeGuide+'.translateX'))
+        mc.setAttr(ikNode+'.lowerLength', mc.getAttr(self.ankleGuide+'.translateX'))
+        mc.setAttr(ikNode+'.restDistance', maths.distance(mc.xform(hipCtl, q=1, ws=1, t=1), mc.xform(ankleCtl, q=1, ws=1, t=1)))
+
+        # Inputs
+        mc.connectAttr(hipCtl+'.worldMatrix[0]', ikNode+'.rootMatrix')
+        mc.connectAttr(ankleCtl+'.worldMatrix[0]', ikNode+'.targetMatrix')
+        mc.connectAttr(poleCtl+'.worldMatrix[0]', ikNode+'.poleMatrix')
+        mc.connectAttr(self.hipGuide+'.parentInverseMatrix[0]', ikNode+'.parentInverseMatrix')
+        mc.connectAttr(self.hipGuide+'.jointOrient', ikNode+'.hipJointOrient')
+        mc.connectAttr(self.kneeGuide+'.jointOrient', ikNode+'.kneeJointOrient')
+        mc.connectAttr(static.masterWalk+'.scaleY', ikNode+'.globalScale')
+
+        # Outputs
+        mc.connectAttr(ikNode+'.hipRotate', self.hipGuide+'.rotate')
+        mc.connectAttr(ikNode+'.kneeRotate', self.kneeGuide+'.rotate')
+        mc.connectAttr(ikNode+'.kneeTranslateX', self.kneeGuide+'.translateX')
+        mc.connectAttr(ikNode+'.ankleTranslateX', self.ankleGuide+'.translateX')
+
+        self.ikNode = ikNode
+        self.restLengthPlugs = {'distance': ikNode+'.restDistance', 'upper': ikNode+'.upperLength', 'lower': ikNode+'.lowerLength'}
+        self.stretchNetwork = [ikNode]
+        return ikNode
+
     def __build_surface_controls(self):
         '''
         Constructing the surface controls: 
@@ -222,9 +343,9 @@ class LegModule:
             surfaceControls[name] = ctlFn.add(guide, self.name+name+'ShapeCtl', parent=self.hipCtl.trn, shapeName='root', deleteGuide=True)
         return surfaceControls
     
-    def __attach_surface_joints(self, surface, jntGuides):
+    def __create_bind_joints(self, jntGuides):
         '''
-        Creating a surface joint for each guide
+        Creating a bind joint for each guide. The joints are stored in self.bindJoints
         
         Returns
         -------
@@ -232,16 +353,68 @@ class LegModule:
         '''
         for guide in jntGuides:
             bindJnt = mc.createNode('joint', name=guide.replace('LOC', 'JNT'))
+            self.bindJoints.append(bindJnt)
+            self.bindJointGuides[guide] = bindJnt
             mc.parent(bindJnt, static.jntGroup)
+            self.guides[guide] = mc.xform(guide, q=1, ws=1, t=1)
+            mc.xform(bindJnt, ws=1, t=self.guides[guide])
+            mc.delete(guide)
+
+    def __attach_surface_joints(self, surface, jntGuides):
+        '''
+        Riveting the bind joint of each guide to the surface
+        
+        Returns
+        -------
+        None
+        '''
+        for guide in jntGuides:
             # Find closest point on surface
-            u, v = fn.get_closest_UV_on_Surface(surface, mc.xform(guide, q=1, ws=1, t=1))
+            u, v = fn.get_closest_UV_on_Surface(surface, self.guides[guide])
             # Rivet to surface
-            fn.rivet_to_surface(surface, bindJnt, u, v)
-            mc.delete(guide)
+            self.rivets[guide] = fn.rivet_to_surface(surface, self.bindJointGuides[guide], u, v)
 
-    def build_leg_surface(self, surface, jntGuides):
+    def __attach_proxy_joints(self):
+        '''
+        Constraining each bind joint to the closest bone of the IK chain, this is how the bind joints move at the proxy level
+        
+        Returns
+        -------
+        None
+        '''
+        hip, knee, ankle = [mc.xform(jnt, q=1, ws=1, t=1) for jnt in self.ikJoints]
+        for guide, bindJnt in self.bindJointGuides.items():
+            position = mc.xform(bindJnt, q=1, ws=1, t=1)
+            upperDistance = maths.point_segment_distance(position, hip, knee)
+            lowerDistance = maths.point_segment_distance(position, knee, ankle)
+            driver = self.hipGuide if upperDistance <= lowerDistance else self.kneeGuide
+            self.proxyConstraints += mc.parentConstraint(driver, bindJnt, mo=1)
+
+    def __create_surface(self, surfaceControls, spans, width):
+        '''
+        Generating the ribbon nurbs surface through our surface controls, see maths.ribbon_surface().
+        The surface is created in a single MFnNurbsSurface call
+
+        Returns
+        -------
+        surface : str : the surface transform
+        '''
+        frames = [mc.xform(ctl.trn, q=1, ws=1, m=1) for ctl in surfaceControls.values()]
+        cvs, uKnots, vKnots = maths.ribbon_surface(frames, spans, width)
+
+        surfaceFn = om.MFnNurbsSurface()
+        transform = surfaceFn.create(om.MPointArray([om.MPoint(*elem) for elem in cvs.reshape(-1, 3)]),
+            om.MDoubleArray(uKnots), om.MDoubleArray(vKnots), 3, 3,
+            om.MFnNurbsSurface.kOpen, om.MFnNurbsSurface.kOpen, False)
+        surface = om.MFnDependencyNode(transform).setName(self.name+'Surface00_NRB')
+        surfaceFn.setName(surface+'Shape')
+        mc.sets(surface, e=1, forceElement='initialShadingGroup')
+        return surface
+
+    def build_leg_surface(self, surface, jntGuides, spans=4, width=1.0):
         '''
         This function takes in a nurbs surface and a list of joints and we construct a ribbon leg set-up.
+        If we don't provide a surface, we generate it from our surface controls (see maths.ribbon_surface()).
 
         1. The control system will consist of the following controls:
             
@@ -253,10 +426,32 @@ class LegModule:
 
         We will use these controls to drive our nurbs surface, by skinning the surface to the controls
 
-        NOTE: To upgrade the implementation of this module we could generate the nurbs surface from our guides as well. After we have created the list of controls we can then define a set of 4 points along each of the up vectors of the control. 
+        The generated surface has 4 CVs along the up vector of each row and spans along the leg,
+        fewer spans evaluate faster. It replaces the modeled surface from the components file.
 
         2. Second part of the set-up focuses on driving the  will requires us to drive the controls 
+
+        At the proxy level we only create the bind joints and constrain them to the IK chain,
+        the ribbon is built the first time we call set_level('full')
+
+        Parameters
+        ----------
+        surface     : str : modeled nurbs surface, None generates it
+        jntGuides   : list : locators we create and rivet the bind joints at
+        spans       : int : spans along the leg of the generated surface
+        width       : float : width of the generated surface
         '''
+        if not self.bindJointGuides:
+            self.__create_bind_joints(jntGuides)
+
+        if self.level == 'proxy':
+            if surface:
+                mc.parent(surface, static.rigGroup)
+                self.surface = surface
+                mc.hide(surface)
+            self.__deferredSurface = (surface, jntGuides, spans, width)
+            self.__attach_proxy_joints()
+            return
 
         # Let's construct our nurbs surface influences -> Our leg shape controls
         
@@ -268,21 +463,28 @@ class LegModule:
             # Decompose
             decomposeMatrix = mc.createNode('decomposeMatrix', name=self.name+shapeName+'Twist_DMT')
             mc.connectAttr(matrixDifference+'.matrixSum', decomposeMatrix+'.inputMatrix')
+            self.ribbonNetwork += [matrixDifference, decomposeMatrix]
 
             return decomposeMatrix
 
-        mc.parent(surface, static.rigGroup)
-        
-       
         surfaceControls = self.__build_surface_controls()     
+        self.surfaceControls = surfaceControls
+
+        if not surface:
+            surface = self.__create_surface(surfaceControls, spans, width)
+        if mc.listRelatives(surface, p=1) != [static.rigGroup]:
+            mc.parent(surface, static.rigGroup)
+        self.surface = surface
+
         skinCluster = mc.skinCluster([elem.jnt for elem in surfaceControls.values()], surface)
+        self.ribbonNetwork += skinCluster
 
         # DRIVING SHAPE CONTROLS
         # Parenting hip and ankle ctl(we want those to be hidden)
         mc.parent(surfaceControls['Hip'].grp, self.hipCtl.jnt)
         mc.parent(surfaceControls['Ankle'].grp, self.ankleCtl.jnt)
         # Parent Knee shape ctl to knee guide
-        mc.parentConstraint(self.kneeGuide, surfaceControls['Knee'].grp, mo=0)
+        self.ribbonNetwork += mc.parentConstraint(self.kneeGuide, surfaceControls['Knee'].grp, mo=0)
         # Drive upper and lower leg 
         surfaceControlsKeys = list(surfaceControls.keys())
         surfaceControlsValues = list(surfaceControls.values())
@@ -293,7 +495,7 @@ class LegModule:
             upperInfluence = surfaceControlsValues[index-1]
             lowerInfluence = surfaceControlsValues[index+1]
             control = surfaceControls[shapeName]
-            mc.pointConstraint(upperInfluence.trn, lowerInfluence.trn, control.grp)
+            self.ribbonNetwork += mc.pointConstraint(upperInfluence.trn, lowerInfluence.trn, control.grp)
             # Simple Aim
             # mc.aimConstraint(lowerInfluence.trn, surfaceControls[shapeName].grp, aim=[1, 0, 0], u=[0, 1, 0], wuo=upperInfluence.trn, wut='objectrotation', wu=[0, 1, 0])
 
@@ -314,14 +516,148 @@ class LegModule:
             mc.setAttr(rotationMult+'.weightA', 0.5)
             mc.setAttr(rotationMult+'.weightB', 0.5)
             mc.connectAttr(rotationMult+'.output', upVectorTrn+'.rotateX')
+            self.ribbonNetwork.append(rotationMult)
 
-            mc.aimConstraint(lowerInfluence.trn, surfaceControls[shapeName].ofs, aim=[1, 0, 0], u=[0, 1, 0], wuo=upVectorTrn, wut='objectrotation', wu=[0, 1, 0])
+            self.ribbonNetwork += mc.aimConstraint(lowerInfluence.trn, surfaceControls[shapeName].ofs, aim=[1, 0, 0], u=[0, 1, 0], wuo=upVectorTrn, wut='objectrotation', wu=[0, 1, 0])
 
             
         # Let's rivet jnts along surface
         self.__attach_surface_joints(surface, jntGuides)
 
     
+    def ribbon_nodes(self):
+        '''
+        All the DG nodes evaluating the ribbon: the ribbon network, the surface shape and the rivet nodes
+        between the surface and the bind joints
+
+        Returns
+        -------
+        nodes : list
+        '''
+        nodes = list(self.ribbonNetwork)
+        if self.surface:
+            nodes += mc.listRelatives(self.surface, s=1, f=1) or []
+
+        # Rivets: everything downstream of the pointOnSurfaceInfo nodes, up to the bind joints
+        queue = list(self.rivets.values())
+        while queue:
+            node = queue.pop()
+            if node in nodes or 'dagNode' in mc.nodeType(node, inherited=1):
+                continue
+            nodes.append(node)
+            queue += mc.listConnections(node, s=0, d=1) or []
+
+        # Some nodes may have been merged away by optimize.optimize_rig()
+        return [node for node in nodes if mc.objExists(node)]
+
+    def evaluation_nodes(self):
+        '''
+        All the DG nodes evaluating the leg rig between the controls and the joints: the stretch network
+        (or the bfxTwoBoneIK node), the foot roll network and the ribbon nodes.
+        bake.enable_cache_playback() freezes them while the joints play back from a cache
+
+        Returns
+        -------
+        nodes : list
+        '''
+        nodes = self.stretchNetwork + self.footRollNetwork
+        return [node for node in nodes if mc.objExists(node)] + self.ribbon_nodes()
+
+    def __freeze_ribbon(self, frozen):
+        '''
+        Freezing the ribbon nodes so the evaluation manager skips them at the proxy level, and un-freezing them
+        '''
+        for node in self.ribbon_nodes():
+            mc.setAttr(node+'.frozen', frozen)
+
+    @contextmanager
+    def __rest_pose(self):
+        '''
+        Temporarily putting the leg controls back to their rest values, so we can build on top of an animated leg.
+        Channels we can't zero (locked, constrained, ...) are fine if they are already at rest,
+        otherwise we raise an error: building the ribbon on a posed leg would give it a wrong bind pose
+        '''
+        controls = [self.hipCtl, self.ankleCtl, self.toeCtl, self.poleVectorCtl] + [getattr(self, name) for name in ['heelCtl', 'footTipCtl'] if hasattr(self, name)]
+        values = []
+        failed = []
+        for ctl in controls:
+            for attribute in ['translate', 'rotate']:
+                for axis in 'XYZ':
+                    plug = ctl.trn+'.'+attribute+axis
+                    value = mc.getAttr(plug)
+                    if abs(value) < 1e-6:
+                        continue
+                    try:
+                        mc.setAttr(plug, 0)
+                        values.append((plug, value))
+                    except RuntimeError:
+                        failed.append(plug)
+
+        if failed:
+            for plug, value in values:
+                mc.setAttr(plug, value)
+            mc.error('Could not put {} back to rest: {}'.format(self.name, ', '.join(failed)))
+
+        try:
+            yield
+        finally:
+            for plug, value in values:
+                mc.setAttr(plug, value)
+
+    def set_level(self, level):
+        '''
+        Switching between the proxy and the full resolution leg.
+
+        proxy   : bind joints follow the IK chain. The ribbon network is disconnected, hidden and frozen, so it isn't evaluated
+        full    : bind joints are riveted to the ribbon surface. If the leg was built as a proxy, the ribbon is built now
+
+        Parameters
+        ----------
+        level   : str : 'proxy' or 'full'
+
+        Returns
+        -------
+        None
+        '''
+        if level not in self.LEVELS:
+            mc.error('Unknown build level "{}", use one of {}'.format(level, self.LEVELS))
+        if level == self.level:
+            return
+
+        ribbonNodes = [self.surface] + [ctl.grp for ctl in (self.surfaceControls or {}).values()]
+        if level == 'full':
+            if self.proxyConstraints:
+                mc.delete(self.proxyConstraints)
+            self.proxyConstraints = []
+            self.level = level
+
+            if not self.rivets:
+                # First time, building the deferred ribbon
+                with self.__rest_pose():
+                    self.build_leg_surface(*self.__deferredSurface)
+            else:
+                self.__freeze_ribbon(False)
+                for bindJnt, inputs in self.__rivetInputs.items():
+                    for source, attribute in inputs:
+                        mc.connectAttr(source, bindJnt+'.'+attribute, f=1)
+                self.__rivetInputs = {}
+            mc.showHidden([node for node in ribbonNodes if node])
+            return
+
+        # Proxy: disconnecting the rivets, so nothing pulls on the ribbon anymore
+        for bindJnt in self.bindJoints:
+            inputs = []
+            for attribute in ['translate', 'rotate']:
+                source = mc.listConnections(bindJnt+'.'+attribute, s=1, d=0, p=1)
+                if source:
+                    mc.disconnectAttr(source[0], bindJnt+'.'+attribute)
+                    inputs.append((source[0], attribute))
+            self.__rivetInputs[bindJnt] = inputs
+        mc.hide([node for node in ribbonNodes if node])
+        self.__freeze_ribbon(True)
+        self.level = level
+        self.__attach_proxy_joints()
+
     def foot_Roll(self, footGuides):
         # Sort our foot guides
         # footGuides = {'front':'', 'back':'', 'positiveX':'', 'negativeX':''}
@@ -336,6 +672,8 @@ class LegModule:
         heelCtl = ctlFn.add(locators[0], name=self.name+'Heel', shapeName='locator', deleteGuide=False, parent=self.ankleCtl.trn)
         
         footTipCtl = ctlFn.add(locators[-1], name=self.name+'FootTip', shapeName='locator', deleteGuide=False, parent=self.ankleCtl.trn)
+        self.heelCtl = heelCtl
+        self.footTipCtl = footTipCtl
 
         # Create our inverse foot roll hierarchy
         inverseHierarchy = []
@@ -345,6 +683,8 @@ class LegModule:
             inverseHierarchy.append(mc.createNode('transform', name=self.name+guideName[i]+'_TRN'))
             mc.parent(inverseHierarchy[-1], inverseHierarchy[-2] if len(inverseHierarchy)>1 else self.ankleCtl.trn)
             mc.xform(inverseHierarchy[-1], ws=1, m=mc.xform(guide, ws=1, q=1, m=1))
+            self.guides[guideName[i]] = mc.xform(guide, ws=1, q=1, t=1)
+            self.footPivots[guideName[i]] = inverseHierarchy[-1]
 
         # Parenting ankleJoint and toes to end of our hierarchy
         mc.parent(self.ankleCtl.jnt, inverseHierarchy[-1])
@@ -391,8 +731,207 @@ class LegModule:
         # Clamp value
         tarsalStraightening = fn.max(self.name+'TarsalStraightening_MAX', tarsalStraightening+'.output', 0)
         mc.connectAttr(tarsalStraightening+'.outColorR', inverseHierarchy[-1]+'.rotateX')
+
+        self.footRollNetwork = [heelNegativeRotation, inversedRot, heelPositiveRotation, tarsalLockRotation,
+            self.name+'ToeRotation_SUB', toeRotation, self.name+'TarsalStraightenRotation_MLT', self.name+'TarsalStraightening_SUB', tarsalStraightening]
+        
+
+
+
         
+    def update_guides(self, guides):
+        '''
+        Pushing edited guide positions onto the built module, without rebuilding it.
+
+        We compare the new positions against the ones we built from and only recompute the parts of the rig
+        depending on the guides that changed:
+            - knee                  -> pole vector position and stretch rest lengths
+            - bind locators         -> rivet U, V parameters
+            - foot guides           -> foot roll pivots
+
+        The hip and ankle guides are skipped (see REBUILD_GUIDES): the hip and ankle controls, the foot and the
+        surface controls were built at their positions, so the leg has to be rebuilt to move them.
+
+        Parameters
+        ----------
+        guides  : dict : {guideKey : [x, y, z]}, where the guide key is one of the keys in self.guides
+                        e.g. {'knee': [10, 45, 2], 'L_legBind03_LOC': [11, 40, 2], 'Heel': [9, 0, -4]}
 
+        Returns
+        -------
+        updated : list : names of the parts of the rig we have recomputed
+        '''
+        changed = []
+        for key, position in guides.items():
+            if key not in self.guides:
+                logging.warning('Guide {} is not part of {}, skipping it'.format(key, self.name))
+                continue
+            if maths.distance(self.guides[key], position) < 1e-6:
+                continue
+            if key in self.REBUILD_GUIDES:
+                logging.warning('Guide {} of {} moves the leg controls, rebuild the leg to apply it'.format(key, self.name))
+                continue
+            self.guides[key] = list(position)
+            changed.append(key)
+
+        updated = []
+        for key in changed:
+            for part in self.GUIDE_DEPENDENCIES.get(key, ['rivets'] if key in self.rivets else []):
+                if part not in updated:
+                    updated.append(part)
+
+        updaters = {
+            'poleVector': self.__update_pole_vector,
+            'stretch': self.__update_stretch,
+            'rivets': lambda: self.__update_rivets([key for key in changed if key in self.rivets]),
+            'footPivots': lambda: self.__update_foot_pivots([key for key in changed if key in self.footPivots]),
+        }
+        for part in updated:
+            updaters[part]()
+
+        return updated
+
+    def __update_pole_vector(self):
+        '''
+        Moving the pole vector control to the position calculated from the current hip, knee and ankle guides
+        '''
+        pos = maths.pole_vector_position(self.guides['hip'], self.guides['knee'], self.guides['ankle'])
+        mc.xform(self.poleVectorCtl.grp, ws=1, t=pos)
 
+    def __update_stretch(self):
+        '''
+        Re-setting the rest lengths stored on our stretch network, or on the bfxTwoBoneIK node.
+        We keep the sign of the previous joint lengths, since the right side chain points down the negative X axis
+        '''
+        hip, knee, ankle = self.guides['hip'], self.guides['knee'], self.guides['ankle']
+        mc.setAttr(self.restLengthPlugs['distance'], maths.distance(hip, ankle))
+        for key, length in [('upper', maths.distance(hip, knee)), ('lower', maths.distance(knee, ankle))]:
+            restLength = mc.getAttr(self.restLengthPlugs[key])
+            mc.setAttr(self.restLengthPlugs[key], -length if restLength < 0 else length)
+
+    def __update_rivets(self, jntGuides):
+        '''
+        Finding the new closest U, V parameters on the leg surface for the changed bind locators
+        '''
+        for guide in jntGuides:
+            u, v = fn.get_closest_UV_on_Surface(self.surface, self.guides[guide])
+            mc.setAttr(self.rivets[guide]+'.parameterU', u)
+            mc.setAttr(self.rivets[guide]+'.parameterV', v)
+
+    def __update_foot_pivots(self, footGuides):
+        '''
+        Moving the foot roll pivots. Every pivot lives in the inverse foot hierarchy, so we store
+        the world position of its children and put them back after moving the pivot.
+        The toe control (and the toe joint under it) sits at the tarsal pivot, so it moves with it
+        '''
+        footControls = {'Heel': self.heelCtl, 'FootTip': self.footTipCtl}
+        for guide in footGuides:
+            pivot = self.footPivots[guide]
+            children = mc.listRelatives(pivot, c=1, type='transform') or []
+            if guide == 'Tarsal':
+                children = [child for child in children if child != self.toeCtl.grp]
+            childPositions = [mc.xform(child, q=1, ws=1, t=1) for child in children]
 
-        
\ No newline at end of file
+            mc.xform(pivot, ws=1, t=self.guides[guide])
+            for child, position in zip(children, childPositions):
+                mc.xform(child, ws=1, t=position)
+
+            if guide in footControls:
+                mc.xform(footControls[guide].grp, ws=1, t=self.guides[guide])
+            if guide == 'Tarsal':
+                mc.xform(self.toeCtl.grp, ws=1, t=self.guides[guide])
+
+
+def compare_ik_solvers(legGuides, parent, poses=20, seed=0, evaluations=200, tolerance=1e-3):
+    '''
+    Building the same leg with both IK solvers and comparing them.
+
+    We duplicate the leg guides, build one leg with the ikHandle set-up and one with the bfxTwoBoneIK node,
+    move both ankle and pole vector controls to the same random poses and compare the world matrices of the IK joints.
+    If they differ by more than the tolerance we raise an error.
+    Then we measure the cost of evaluating each chain after its ankle control has moved
+
+    Parameters
+    ----------
+    legGuides   : str : first joint of the leg guides, e.g. L_leg00_JNT
+    parent      : str : hook under which we are parenting our legs
+    poses       : int : number of random poses we compare
+    seed        : int : random seed for the poses
+    evaluations : int : number of evaluations we time for each solver
+    tolerance   : float : largest difference we accept between the world matrix values of the two chains
+
+    Returns
+    -------
+    report : dict : {'maxError': float, 'ikHandle': ms per evaluation, 'analytic': ms per evaluation}
+    '''
+    side = legGuides[0]
+    analyticGuides = mc.duplicate(legGuides, rc=1)[0]
+    legs = {
+        'ikHandle': LegModule(name=side+'_legIkHandle', parent=parent, legGuides=legGuides, ikSolver='ikHandle'),
+        'analytic': LegModule(name=side+'_legAnalytic', parent=parent, legGuides=analyticGuides, ikSolver='analytic'),
+    }
+
+    # Numeric match
+    generator = random.Random(seed)
+    maxError = 0.0
+    for _ in range(poses):
+        ankleOffset = [generator.uniform(-10, 10) for _ in range(3)]
+        poleOffset = [generator.uniform(-10, 10) for _ in range(3)]
+        matrices = []
+        for leg in legs.values():
+            mc.setAttr(leg.ankleCtl.trn+'.translate', *ankleOffset)
+            mc.setAttr(leg.poleVectorCtl.trn+'.translate', *poleOffset)
+            matrices.append(np.array([mc.xform(jnt, q=1, ws=1, m=1) for jnt in leg.ikJoints]))
+        maxError = max(maxError, float(np.abs(matrices[0] - matrices[1]).max()))
+
+    for leg in legs.values():
+        mc.setAttr(leg.ankleCtl.trn+'.translate', 0, 0, 0)
+        mc.setAttr(leg.poleVectorCtl.trn+'.translate', 0, 0, 0)
+    if maxError > tolerance:
+        mc.error('bfxTwoBoneIK differs from the ikHandle by {} (tolerance {})'.format(maxError, tolerance))
+
+    # Evaluation cost
+    report = {'maxError': maxError}
+    for solver, leg in legs.items():
+        start = time.perf_counter()
+        for i in range(evaluations):
+            mc.setAttr(leg.ankleCtl.trn+'.translateY', (i % 20)*0.5)
+            mc.xform(leg.ankleGuide, q=1, ws=1, m=1)
+        report[solver] = (time.perf_counter() - start)*1000.0/evaluations
+        mc.setAttr(leg.ankleCtl.trn+'.translateY', 0)
+
+    logging.info('IK solver comparison: {}'.format(report))
+    return report
+
+
+def compare_levels(legs, startFrame=None, endFrame=None):
+    '''
+    Measuring the node count and playback frame rate of the scene at each build level.
+    Legs built at the proxy level don't have their ribbon networks yet. Legs built at the full level keep them
+    at the proxy level, frozen, the report shows how many of their nodes are frozen at each level
+
+    Parameters
+    ----------
+    legs        : list : LegModule instances
+    startFrame  : int : defaults to the playback start
+    endFrame    : int : defaults to the playback end
+
+    Returns
+    -------
+    report : dict : {level : {'nodes': int, 'ribbonNodes': int, 'frozenNodes': int, 'fps': float}}
+            ribbonNodes is the size of the legs' ribbon networks, frozenNodes how many of those are frozen
+    '''
+    report = {}
+    for level in LegModule.LEVELS:
+        for leg in legs:
+            leg.set_level(level)
+        ribbonNodes = [node for leg in legs for node in leg.ribbon_nodes()]
+        report[level] = {
+            'nodes': sum(profiling.count_nodes().values()),
+            'ribbonNodes': len(ribbonNodes),
+            'frozenNodes': sum(1 for node in ribbonNodes if mc.getAttr(node+'.frozen')),
+            'fps': profiling.playback_fps(startFrame, endFrame),
+        }
+
+    logging.info('Build level comparison: {}'.format(report))
+    return report
@@ -0,0 +1,32 @@
+'''
+Maya plugins shipped with the masterclass package. Each plugin is a single python file in this folder
+'''
+import os
+
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+
+
+def available():
+    '''
+    Returns
+    -------
+    names : list : names of all our plugins, e.g. ['matrixCache', 'twoBoneIK']
+    '''
+    folder = os.path.dirname(os.path.abspath(__file__))
+    return sorted(elem[:-3] for elem in os.listdir(folder) if elem.endswith('.py') and elem != '__init__.py')
+
+def load(name):
+    '''
+    Loading one of our plugins, if it isn't loaded already
+
+    Parameters
+    ----------
+    name    : str : plugin file name without extension, e.g. 'twoBoneIK'
+
+    Returns
+    -------
+    None
+    '''
+    if not mc.pluginInfo(name, q=1, loaded=1):
+        mc.loadPlugin(os.path.join(os.path.dirname(os.path.abspath(__file__)), name+'.py').replace('\\', '/'))
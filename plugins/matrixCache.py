@@ -0,0 +1,152 @@
+'''
+bfxMatrixCache node
+
+Reads a baked world matrix cache (see utils.bake.bake_matrices()) and drives the baked joints from it,
+instead of the rig. One node drives all the joints of the cache: on every frame it reads one (joints x 16) slice
+of the memory mapped cache and outputs the local translate and rotate of each joint:
+
+    local = world * parentInverse
+    rotate = localRotation * jointOrient^-1
+
+The parent inverse comes from the cache when the parent is one of the baked joints (parentIndex >= 0),
+otherwise from the parentInverseMatrix input.
+
+utils.bake.enable_cache_playback() sets it up, utils.bake.disable_cache_playback() goes back to the rig
+'''
+from maya.api import OpenMaya as om
+
+import numpy as np
+
+from BFX_masterclass.utils import bake
+
+
+def maya_useNewAPI():
+    pass
+
+def to_array(matrix):
+    return np.array(list(matrix), dtype=float).reshape(4, 4)
+
+class MatrixCache(om.MPxNode):
+    name = 'bfxMatrixCache'
+    id = om.MTypeId(0x0007F101)
+
+    # X, Y, Z children of our angle compounds
+    children = {}
+
+    @staticmethod
+    def creator():
+        return MatrixCache()
+
+    @staticmethod
+    def initialize():
+        typedFn = om.MFnTypedAttribute()
+        unitFn = om.MFnUnitAttribute()
+        numericFn = om.MFnNumericAttribute()
+        matrixFn = om.MFnMatrixAttribute()
+
+        def angle_array_attribute(longName, shortName, output=False):
+            children = []
+            for axis in 'XYZ':
+                children.append(unitFn.create(longName+axis, shortName+axis.lower(), om.MFnUnitAttribute.kAngle, 0.0))
+            attribute = numericFn.create(longName, shortName, *children)
+            numericFn.array = True
+            numericFn.usesArrayDataBuilder = True
+            numericFn.writable = not output
+            numericFn.storable = not output
+            MatrixCache.addAttribute(attribute)
+            MatrixCache.children[longName] = children
+            return attribute
+
+        # Inputs
+        MatrixCache.time = unitFn.create('time', 'tm', om.MFnUnitAttribute.kTime, 0.0)
+        MatrixCache.addAttribute(MatrixCache.time)
+
+        MatrixCache.cachePath = typedFn.create('cachePath', 'cp', om.MFnData.kString)
+        MatrixCache.addAttribute(MatrixCache.cachePath)
+
+        MatrixCache.parentIndex = numericFn.create('parentIndex', 'pi', om.MFnNumericData.kInt, -1)
+        numericFn.array = True
+        MatrixCache.addAttribute(MatrixCache.parentIndex)
+
+        MatrixCache.parentInverseMatrix = matrixFn.create('parentInverseMatrix', 'pim', om.MFnMatrixAttribute.kDouble)
+        matrixFn.array = True
+        MatrixCache.addAttribute(MatrixCache.parentInverseMatrix)
+
+        MatrixCache.jointOrient = angle_array_attribute('jointOrient', 'jo')
+
+        # Outputs
+        MatrixCache.outputTranslate = numericFn.createPoint('outputTranslate', 'ot')
+        numericFn.array = True
+        numericFn.usesArrayDataBuilder = True
+        numericFn.writable = False
+        numericFn.storable = False
+        MatrixCache.addAttribute(MatrixCache.outputTranslate)
+
+        MatrixCache.outputRotate = angle_array_attribute('outputRotate', 'or', output=True)
+
+        for inputAttribute in [MatrixCache.time, MatrixCache.cachePath, MatrixCache.parentIndex, MatrixCache.parentInverseMatrix, MatrixCache.jointOrient]:
+            for outputAttribute in [MatrixCache.outputTranslate, MatrixCache.outputRotate]:
+                MatrixCache.attributeAffects(inputAttribute, outputAttribute)
+
+    def compute(self, plug, dataBlock):
+        path = dataBlock.inputValue(MatrixCache.cachePath).asString()
+        if not path:
+            return
+        # Shared by all the nodes reading the same file, re-opened when the file is baked again
+        cache, index = bake.get_matrix_cache(path)
+
+        # Frame slice, we hold the first and last frame outside the baked range
+        frame = dataBlock.inputValue(MatrixCache.time).asTime().asUnits(om.MTime.uiUnit())
+        frameIndex = min(max(int(round(frame)) - index['startFrame'], 0), len(cache) - 1)
+        worldMatrices = np.asarray(cache[frameIndex], dtype=float).reshape(-1, 4, 4)
+
+        def array_values(attribute, convert):
+            arrayHandle = dataBlock.inputArrayValue(attribute)
+            values = {}
+            for physicalIndex in range(len(arrayHandle)):
+                arrayHandle.jumpToPhysicalElement(physicalIndex)
+                values[arrayHandle.elementLogicalIndex()] = convert(arrayHandle.inputValue())
+            return values
+
+        def joint_orient(handle):
+            angles = [handle.child(child).asAngle().asRadians() for child in MatrixCache.children['jointOrient']]
+            return to_array(om.MEulerRotation(*angles).asMatrix())[:3, :3]
+
+        parentIndices = array_values(MatrixCache.parentIndex, lambda handle: handle.asInt())
+        parentInverses = array_values(MatrixCache.parentInverseMatrix, lambda handle: to_array(handle.asMatrix()))
+        jointOrients = array_values(MatrixCache.jointOrient, joint_orient)
+
+        translateArray = dataBlock.outputArrayValue(MatrixCache.outputTranslate)
+        translateBuilder = translateArray.builder()
+        rotateArray = dataBlock.outputArrayValue(MatrixCache.outputRotate)
+        rotateBuilder = rotateArray.builder()
+
+        for i, world in enumerate(worldMatrices):
+            parent = parentIndices.get(i, -1)
+            parentInverse = np.linalg.inv(worldMatrices[parent]) if parent >= 0 else parentInverses.get(i, np.identity(4))
+            local = world @ parentInverse
+
+            rotation = local[:3, :3]/np.linalg.norm(local[:3, :3], axis=1)[:, None]
+            rotation = rotation @ jointOrients.get(i, np.identity(3)).T
+            matrix = np.identity(4)
+            matrix[:3, :3] = rotation
+            euler = om.MEulerRotation.decompose(om.MMatrix(matrix.flatten().tolist()), om.MEulerRotation.kXYZ)
+
+            translateBuilder.addElement(i).set3Double(*local[3, :3])
+            rotateHandle = rotateBuilder.addElement(i)
+            for child, angle in zip(MatrixCache.children['outputRotate'], [euler.x, euler.y, euler.z]):
+                rotateHandle.child(child).setMAngle(om.MAngle(angle))
+
+        translateArray.set(translateBuilder)
+        translateArray.setAllClean()
+        rotateArray.set(rotateBuilder)
+        rotateArray.setAllClean()
+
+def initializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin, 'BFX masterclass', '1.0')
+    pluginFn.registerNode(MatrixCache.name, MatrixCache.id, MatrixCache.creator, MatrixCache.initialize)
+
+def uninitializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin)
+    pluginFn.deregisterNode(MatrixCache.id)
+    bake.release_matrix_cache()
@@ -0,0 +1,168 @@
+'''
+bfxTwoBoneIK node
+
+Single node replacing the ikHandle, poleVectorConstraint and stretch network of a leg.
+In one compute we do what LegModule.stretch_IK() and the ikRPsolver do separately:
+
+    1. Stretch
+        factor = globalScale * max(distance(root, target) / restDistance, 1)
+        knee.tX = upperLength * factor
+        ankle.tX = lowerLength * factor
+
+    2. Analytic two bone solve with the pole vector, see maths.two_bone_ik()
+
+    3. Joint rotations
+        The hip and knee keep the same orientation relative to the IK plane as in their rest pose.
+        We store that as hipOffset/kneeOffset = restWorldRotation * restPlaneFrame^-1, so
+            world rotation = offset * planeFrame
+            rotate = localRotation * jointOrient^-1
+
+Load it with plugins.load('twoBoneIK'), LegModule(ikSolver='analytic') sets it up for us
+'''
+from maya.api import OpenMaya as om
+
+import numpy as np
+
+from BFX_masterclass.utils import maths
+
+
+def maya_useNewAPI():
+    pass
+
+def to_array(matrix):
+    return np.array(list(matrix), dtype=float).reshape(4, 4)
+
+def to_rotation(matrix):
+    # 3x3 rotation of a 4x4 matrix, without scale
+    rotation = matrix[:3, :3]
+    return rotation/np.linalg.norm(rotation, axis=1)[:, None]
+
+def euler_rotation(rotation):
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation
+    return om.MEulerRotation.decompose(om.MMatrix(matrix.flatten().tolist()), om.MEulerRotation.kXYZ)
+
+class TwoBoneIK(om.MPxNode):
+    name = 'bfxTwoBoneIK'
+    id = om.MTypeId(0x0007F100)
+
+    # X, Y, Z children of our angle compounds
+    children = {}
+
+    @staticmethod
+    def creator():
+        return TwoBoneIK()
+
+    @staticmethod
+    def initialize():
+        matrixFn = om.MFnMatrixAttribute()
+        numericFn = om.MFnNumericAttribute()
+        unitFn = om.MFnUnitAttribute()
+
+        def matrix_attribute(longName, shortName):
+            attribute = matrixFn.create(longName, shortName, om.MFnMatrixAttribute.kDouble)
+            TwoBoneIK.addAttribute(attribute)
+            return attribute
+
+        def double_attribute(longName, shortName, default=0.0, output=False):
+            attribute = numericFn.create(longName, shortName, om.MFnNumericData.kDouble, default)
+            numericFn.writable = not output
+            numericFn.storable = not output
+            numericFn.keyable = not output
+            TwoBoneIK.addAttribute(attribute)
+            return attribute
+
+        def angle_attribute(longName, shortName, output=False):
+            children = []
+            for axis in 'XYZ':
+                children.append(unitFn.create(longName+axis, shortName+axis.lower(), om.MFnUnitAttribute.kAngle, 0.0))
+            attribute = numericFn.create(longName, shortName, *children)
+            numericFn.writable = not output
+            numericFn.storable = not output
+            TwoBoneIK.addAttribute(attribute)
+            TwoBoneIK.children[longName] = children
+            return attribute
+
+        # Inputs
+        TwoBoneIK.rootMatrix = matrix_attribute('rootMatrix', 'rm')
+        TwoBoneIK.targetMatrix = matrix_attribute('targetMatrix', 'tm')
+        TwoBoneIK.poleMatrix = matrix_attribute('poleMatrix', 'pm')
+        TwoBoneIK.parentInverseMatrix = matrix_attribute('parentInverseMatrix', 'pim')
+        TwoBoneIK.hipOffset = matrix_attribute('hipOffset', 'ho')
+        TwoBoneIK.kneeOffset = matrix_attribute('kneeOffset', 'ko')
+        TwoBoneIK.hipJointOrient = angle_attribute('hipJointOrient', 'hjo')
+        TwoBoneIK.kneeJointOrient = angle_attribute('kneeJointOrient', 'kjo')
+        TwoBoneIK.upperLength = double_attribute('upperLength', 'ul', 1.0)
+        TwoBoneIK.lowerLength = double_attribute('lowerLength', 'll', 1.0)
+        TwoBoneIK.restDistance = double_attribute('restDistance', 'rd', 1.0)
+        TwoBoneIK.globalScale = double_attribute('globalScale', 'gs', 1.0)
+        TwoBoneIK.stretch = double_attribute('stretch', 'st', 1.0)
+
+        # Outputs
+        TwoBoneIK.hipRotate = angle_attribute('hipRotate', 'hr', output=True)
+        TwoBoneIK.kneeRotate = angle_attribute('kneeRotate', 'kr', output=True)
+        TwoBoneIK.kneeTranslateX = double_attribute('kneeTranslateX', 'ktx', output=True)
+        TwoBoneIK.ankleTranslateX = double_attribute('ankleTranslateX', 'atx', output=True)
+
+        inputs = [TwoBoneIK.rootMatrix, TwoBoneIK.targetMatrix, TwoBoneIK.poleMatrix, TwoBoneIK.parentInverseMatrix,
+            TwoBoneIK.hipOffset, TwoBoneIK.kneeOffset, TwoBoneIK.hipJointOrient, TwoBoneIK.kneeJointOrient,
+            TwoBoneIK.upperLength, TwoBoneIK.lowerLength, TwoBoneIK.restDistance, TwoBoneIK.globalScale, TwoBoneIK.stretch]
+        outputs = [TwoBoneIK.hipRotate, TwoBoneIK.kneeRotate, TwoBoneIK.kneeTranslateX, TwoBoneIK.ankleTranslateX]
+        for inputAttribute in inputs:
+            for outputAttribute in outputs:
+                TwoBoneIK.attributeAffects(inputAttribute, outputAttribute)
+
+    def compute(self, plug, dataBlock):
+        def matrix(attribute):
+            return to_array(dataBlock.inputValue(attribute).asMatrix())
+
+        def joint_orient(longName, attribute):
+            handle = dataBlock.inputValue(attribute)
+            angles = [handle.child(child).asAngle().asRadians() for child in TwoBoneIK.children[longName]]
+            return to_rotation(to_array(om.MEulerRotation(*angles).asMatrix()))
+
+        root = matrix(TwoBoneIK.rootMatrix)[3, :3]
+        target = matrix(TwoBoneIK.targetMatrix)[3, :3]
+        pole = matrix(TwoBoneIK.poleMatrix)[3, :3]
+        parentInverse = matrix(TwoBoneIK.parentInverseMatrix)
+        upperLength = dataBlock.inputValue(TwoBoneIK.upperLength).asDouble()
+        lowerLength = dataBlock.inputValue(TwoBoneIK.lowerLength).asDouble()
+        restDistance = dataBlock.inputValue(TwoBoneIK.restDistance).asDouble()
+        globalScale = dataBlock.inputValue(TwoBoneIK.globalScale).asDouble()
+        stretch = dataBlock.inputValue(TwoBoneIK.stretch).asDouble()
+
+        # Stretch
+        ratio = maths.distance(root, target)/restDistance if restDistance else 1.0
+        factor = globalScale * (1.0 + stretch*(max(ratio, 1.0) - 1.0))
+        kneeTranslateX = upperLength*factor
+        ankleTranslateX = lowerLength*factor
+
+        # Solve in world space, the chain lengths are scaled by the chain's parent
+        parentScale = 1.0/np.linalg.norm(parentInverse[0, :3])
+        _, hipFrame, kneeFrame = maths.two_bone_ik(root, target, pole, kneeTranslateX*parentScale, ankleTranslateX*parentScale)
+
+        hipWorld = to_rotation(matrix(TwoBoneIK.hipOffset)) @ hipFrame
+        kneeWorld = to_rotation(matrix(TwoBoneIK.kneeOffset)) @ kneeFrame
+
+        hipLocal = hipWorld @ to_rotation(parentInverse)
+        kneeLocal = kneeWorld @ hipWorld.T
+        hipRotate = euler_rotation(hipLocal @ joint_orient('hipJointOrient', TwoBoneIK.hipJointOrient).T)
+        kneeRotate = euler_rotation(kneeLocal @ joint_orient('kneeJointOrient', TwoBoneIK.kneeJointOrient).T)
+
+        for longName, attribute, rotation in [('hipRotate', TwoBoneIK.hipRotate, hipRotate), ('kneeRotate', TwoBoneIK.kneeRotate, kneeRotate)]:
+            handle = dataBlock.outputValue(attribute)
+            for child, angle in zip(TwoBoneIK.children[longName], [rotation.x, rotation.y, rotation.z]):
+                handle.child(child).setMAngle(om.MAngle(angle))
+            handle.setClean()
+        for attribute, value in [(TwoBoneIK.kneeTranslateX, kneeTranslateX), (TwoBoneIK.ankleTranslateX, ankleTranslateX)]:
+            handle = dataBlock.outputValue(attribute)
+            handle.setDouble(value)
+            handle.setClean()
+
+def initializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin, 'BFX masterclass', '1.0')
+    pluginFn.registerNode(TwoBoneIK.name, TwoBoneIK.id, TwoBoneIK.creator, TwoBoneIK.initialize)
+
+def uninitializePlugin(plugin):
+    pluginFn = om.MFnPlugin(plugin)
+    pluginFn.deregisterNode(TwoBoneIK.id)
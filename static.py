@@ -1,10 +1,18 @@
-
 '''
 Storing some constants in here
+
+Paths depend on the user and the machine, so they are not resolved when we import this module.
+They are resolved through the settings object the first time we ask for them, and can be overridden
+with environment variables or by setting them on static.settings:
+
+    BFX_USER                -> static.settings.userName
+    BFX_PROJECT             -> static.settings.project
+    BFX_CONTROL_SHAPES      -> static.settings.controlShapeFile
+
+static.project, static.controlShapeFile and static.userName still work, they are forwarded to the settings
 '''
 import getpass
-
-userName = getpass.getuser()
+import os
 
 characterGroup = 'C_character_GRP'
 masterWalk = 'C_masterWalk_GRP'
@@ -14,6 +22,59 @@ ctlGroup = 'C_ctl_GRP'
 jntGroup = 'C_jnt_GRP'
 
 geometryGroup = 'geometry_GRP'
-controlShapeFile = 'C:/Users/{}/Documents/maya/scripts/BFX_masterclass/controlShapes.json'.format(userName)
 
-project = r'C://Users//{}//Documents//maya//projects//BFX_masterclass'.format(userName)
\ No newline at end of file
+
+class Settings:
+    '''
+    Paths used by the pipeline. Every value is resolved on first use, unless it was set before
+
+    Parameters
+    ----------
+    userName            : str : user name used in the default project path
+    project             : str : root folder of the masterclass projects
+    controlShapeFile    : str : the control shape library json file
+
+    '''
+    def __init__(self, userName=None, project=None, controlShapeFile=None):
+        self._userName=userName
+        self._project=project
+        self._controlShapeFile=controlShapeFile
+
+    @property
+    def userName(self):
+        if self._userName is None:
+            self._userName = os.environ.get('BFX_USER') or getpass.getuser()
+        return self._userName
+
+    @userName.setter
+    def userName(self, value):
+        self._userName = value
+
+    @property
+    def project(self):
+        if self._project is None:
+            self._project = os.environ.get('BFX_PROJECT') or r'C://Users//{}//Documents//maya//projects//BFX_masterclass'.format(self.userName)
+        return self._project
+
+    @project.setter
+    def project(self, value):
+        self._project = value
+
+    @property
+    def controlShapeFile(self):
+        if self._controlShapeFile is None:
+            # The shape library ships with the package
+            self._controlShapeFile = os.environ.get('BFX_CONTROL_SHAPES') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'controlShapes.json').replace('\\', '/')
+        return self._controlShapeFile
+
+    @controlShapeFile.setter
+    def controlShapeFile(self, value):
+        self._controlShapeFile = value
+
+settings = Settings()
+
+def __getattr__(name):
+    # Forwarding the paths to our settings, so they are only resolved when used
+    if name in ('userName', 'project', 'controlShapeFile'):
+        return getattr(settings, name)
+    raise AttributeError("module {} has no attribute {}".format(__name__, name))
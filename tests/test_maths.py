@@ -0,0 +1,64 @@
+'''
+Headless checks of the analytic two bone IK in utils/maths.py. Doesn't need maya:
+
+    python -m unittest discover tests
+'''
+import importlib.util
+import os
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loading the module from its file, so the check runs without the BFX_masterclass package on the path
+spec = importlib.util.spec_from_file_location('maths', os.path.join(ROOT, 'utils', 'maths.py'))
+maths = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(maths)
+
+
+class TwoBoneIKTest(unittest.TestCase):
+
+    def setUp(self):
+        generator = np.random.default_rng(0)
+        self.poses = []
+        for _ in range(50):
+            root = generator.uniform(-10, 10, 3)
+            target = root + generator.uniform(-6, 6, 3)
+            pole = root + generator.uniform(-10, 10, 3)
+            self.poses.append((root, target, pole, generator.uniform(2, 5), generator.uniform(2, 5)))
+
+    def test_bone_lengths(self):
+        for root, target, pole, upper, lower in self.poses:
+            knee, hipFrame, kneeFrame = maths.two_bone_ik(root, target, pole, upper, lower)
+            self.assertAlmostEqual(np.linalg.norm(knee - root), upper)
+            # The knee frame aims at the end of the chain, one lower length away, which reaches the target when it can
+            end = knee + kneeFrame[0]*lower
+            if abs(upper - lower) <= np.linalg.norm(target - root) <= upper + lower:
+                np.testing.assert_allclose(end, target, atol=1e-6)
+
+    def test_knee_in_pole_plane(self):
+        for root, target, pole, upper, lower in self.poses:
+            knee, hipFrame, kneeFrame = maths.two_bone_ik(root, target, pole, upper, lower)
+            normal = np.cross(target - root, pole - root)
+            normal /= np.linalg.norm(normal)
+            self.assertAlmostEqual(np.dot(knee - root, normal), 0.0)
+            # On the pole side of the root/target line
+            axis = (target - root)/np.linalg.norm(target - root)
+            poleSide = (pole - root) - axis*np.dot(pole - root, axis)
+            self.assertGreaterEqual(np.dot(knee - root, poleSide), -1e-9)
+            # Frames are orthonormal
+            for frame in (hipFrame, kneeFrame):
+                np.testing.assert_allclose(frame @ frame.T, np.identity(3), atol=1e-9)
+
+    def test_out_of_reach_straightens(self):
+        root, pole = np.zeros(3), np.array([0.0, 0.0, 10.0])
+        target = np.array([0.0, 20.0, 0.0])
+        knee, hipFrame, kneeFrame = maths.two_bone_ik(root, target, pole, 4.0, 3.0)
+        np.testing.assert_allclose(knee, [0, 4, 0], atol=1e-9)
+        np.testing.assert_allclose(hipFrame[0], [0, 1, 0], atol=1e-9)
+        np.testing.assert_allclose(kneeFrame[0], [0, 1, 0], atol=1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+'''
+Headless checks of utils/mayaAscii.py against tests/data/legGuides.ma, a Maya 2022 style file
+(rename -uid after every createNode). Doesn't need maya:
+
+    python -m unittest discover tests
+'''
+import importlib.util
+import os
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, 'tests', 'data', 'legGuides.ma')
+
+# Loading the module from its file, so the check runs without the BFX_masterclass package on the path
+spec = importlib.util.spec_from_file_location('mayaAscii', os.path.join(ROOT, 'utils', 'mayaAscii.py'))
+mayaAscii = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mayaAscii)
+
+
+class ReadGuidesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = mayaAscii.read_nodes(SAMPLE)
+        self.guides = mayaAscii.read_guides(self.nodes)
+
+    def test_nodes(self):
+        self.assertEqual(self.nodes['L_leg01_JNT']['parent'], 'L_leg00_JNT')
+        self.assertEqual(self.nodes['L_legBind00_LOCShape']['type'], 'locator')
+        self.assertNotIn('translate', self.nodes['C_unrelated00_GRP'])
+
+    def test_world_positions(self):
+        np.testing.assert_allclose(self.guides['C_guides00_GRP'], [0, 10, 0])
+        np.testing.assert_allclose(self.guides['L_leg00_JNT'], [5, 90, 0])
+        np.testing.assert_allclose(self.guides['L_leg01_JNT'], [5, 50, 0], atol=1e-9)
+        np.testing.assert_allclose(self.guides['L_legBind00_LOC'], [5, 80, 2])
+
+    def test_surface_cvs(self):
+        cvs = self.guides['L_legSurface00_NRB']
+        self.assertEqual(cvs.shape, (2, 2, 3))
+        np.testing.assert_allclose(cvs.reshape(-1, 3), [[5, 10, 0], [5, 10, 1], [6, 10, 0], [6, 10, 1]])
+
+    def test_fingerprint(self):
+        self.assertEqual(mayaAscii.fingerprint(self.guides), mayaAscii.fingerprint(mayaAscii.read_guides(mayaAscii.read_nodes(SAMPLE))))
+        moved = dict(self.guides)
+        moved['L_leg00_JNT'] = moved['L_leg00_JNT'] + 1.0
+        self.assertNotEqual(mayaAscii.fingerprint(self.guides), mayaAscii.fingerprint(moved))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+from BFX_masterclass.utils.lazy import LazyModule
+om = LazyModule('maya.api.OpenMaya')
+mc = LazyModule('maya.cmds')
+
+import json
+import logging
+import os
+
+import numpy as np
+
+from BFX_masterclass.utils import profiling
+from BFX_masterclass import plugins
+
+# {path : ((mtime, size), cache, index)}, caches opened for playback, see get_matrix_cache()
+_CACHES = {}
+
+def get_world_matrix_plugs(joints):
+    '''
+    Building a list of worldMatrix[0] plugs, one for each joint.
+    We resolve the plugs once so we don't have to look them up again on every frame
+
+    Parameters
+    ----------
+    joints  : list : names of the joints we want to read
+
+    Returns
+    -------
+    plugs : list of MPlug
+    '''
+    selection_list = om.MSelectionList()
+    for jnt in joints:
+        selection_list.add(jnt)
+
+    plugs = []
+    for i in range(selection_list.length()):
+        dependNode = om.MFnDependencyNode(selection_list.getDependNode(i))
+        plugs.append(dependNode.findPlug('worldMatrix', False).elementByLogicalIndex(0))
+    return plugs
+
+def read_world_matrices(plugs, context, out):
+    '''
+    Evaluating all the world matrix plugs in the given DG context and writing the flattened matrices into out
+
+    Parameters
+    ----------
+    plugs   : list of MPlug : plugs returned by get_world_matrix_plugs()
+    context : MDGContext : the context (time) we are evaluating in
+    out     : numpy.ndarray : (joints x 16) array we are filling in
+
+    Returns
+    -------
+    None
+    '''
+    previousContext = context.makeCurrent()
+    try:
+        for i, plug in enumerate(plugs):
+            out[i] = om.MFnMatrixData(plug.asMObject()).matrix()
+    finally:
+        previousContext.makeCurrent()
+
+def bake_matrices(joints, path, startFrame=None, endFrame=None):
+    '''
+    Baking the world matrices of the provided joints over a frame range into a float32 numpy cache.
+
+    We do not step the timeline. Each frame is evaluated through a DG context so the viewport never refreshes, and
+    all the matrices for a frame are pulled in one pass over the pre-resolved plugs.
+
+    The cache is written as two files:
+        - path          : .npy array of shape (frames, joints, 16) which can be opened memory mapped
+        - path.json     : name index {'joints': [...], 'startFrame': int, 'endFrame': int}
+
+    Parameters
+    ----------
+    joints      : list : names of the joints to bake, e.g. leg.bindJoints + leg.ikJoints
+    path        : str : the .npy file we are writing to
+    startFrame  : int : first frame to bake, defaults to the playback start
+    endFrame    : int : last frame to bake, defaults to the playback end
+
+    Returns
+    -------
+    path : str
+    '''
+    if startFrame is None:
+        startFrame = int(mc.playbackOptions(q=1, min=1))
+    if endFrame is None:
+        endFrame = int(mc.playbackOptions(q=1, max=1))
+
+    frames = range(int(startFrame), int(endFrame)+1)
+    plugs = get_world_matrix_plugs(joints)
+
+    # A mapping still open on the file would stop us from overwriting it (Windows) or serve the old frames
+    release_matrix_cache(path)
+
+    cache = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(len(frames), len(plugs), 16))
+    frameMatrices = np.empty((len(plugs), 16), dtype=np.float64)
+    timeUnit = om.MTime.uiUnit()
+    for i, frame in enumerate(frames):
+        read_world_matrices(plugs, om.MDGContext(om.MTime(frame, timeUnit)), frameMatrices)
+        cache[i] = frameMatrices
+    cache.flush()
+    del cache
+
+    with open(path+'.json', 'w') as f:
+        json.dump({'joints': list(joints), 'startFrame': frames[0], 'endFrame': frames[-1]}, f, indent=4)
+
+    return path
+
+def load_matrix_cache(path):
+    '''
+    Opening a cache written by bake_matrices(). The array is memory mapped so only the frames we read are loaded
+
+    Parameters
+    ----------
+    path    : str : the .npy cache file
+
+    Returns
+    -------
+    cache   : numpy.memmap : (frames, joints, 16) float32 array
+    index   : dict : {'joints': [...], 'startFrame': int, 'endFrame': int}
+    '''
+    with open(path+'.json', 'r') as f:
+        index = json.load(f)
+    cache = np.load(path, mmap_mode='r')
+
+    return cache, index
+
+def get_matrix_cache(path):
+    '''
+    Returns a cache opened with load_matrix_cache(), shared by everything reading the same file (e.g. bfxMatrixCache nodes).
+    The file is re-opened if it has been written again since we opened it
+
+    Parameters
+    ----------
+    path    : str : the .npy cache file
+
+    Returns
+    -------
+    cache   : numpy.memmap
+    index   : dict
+    '''
+    stat = os.stat(path)
+    stamp = (stat.st_mtime, stat.st_size)
+    if path not in _CACHES or _CACHES[path][0] != stamp:
+        release_matrix_cache(path)
+        _CACHES[path] = (stamp, ) + load_matrix_cache(path)
+    return _CACHES[path][1:]
+
+def release_matrix_cache(path=None):
+    '''
+    Dropping our reference to a cache opened with get_matrix_cache(), numpy closes the memory mapping
+    once nothing else holds on to the array
+
+    Parameters
+    ----------
+    path    : str : the .npy cache file, None releases all of them
+
+    Returns
+    -------
+    None
+    '''
+    for key in ([path] if path else list(_CACHES)):
+        _CACHES.pop(key, None)
+
+def get_upstream_network(plugs):
+    '''
+    Walking upstream from the given plugs through the DG nodes driving them. We stop at DAG nodes (controls, joints)
+    and at the time node, so the network only holds the nodes between the rig transforms and the plugs
+
+    Parameters
+    ----------
+    plugs   : list : destination plugs, e.g. the joint inputs we have recorded
+
+    Returns
+    -------
+    nodes : list
+    '''
+    nodes = []
+    queue = [elem.split('.')[0] for elem in plugs]
+    while queue:
+        node = queue.pop()
+        if node in nodes or mc.nodeType(node) == 'time' or 'dagNode' in mc.nodeType(node, inherited=1):
+            continue
+        nodes.append(node)
+        queue += mc.listConnections(node, s=1, d=0) or []
+    return nodes
+
+def enable_cache_playback(path, legs=(), name='C_matrixCache_MCR'):
+    '''
+    Driving the baked joints from their cache instead of the rig, for fast playback (shot review, lighting).
+
+    One bfxMatrixCache node reads the memory mapped cache and drives the translate and rotate of every joint in it.
+    So the rig isn't evaluated anymore we:
+        - break the rig connections into the baked joints
+        - turn off the ikHandles solving the baked joints (ikBlend = 0), they don't drive them through connections
+        - freeze the DG networks which were driving the joints (stretch, rivets, ...)
+          and the networks of the legs (LegModule.evaluation_nodes(): foot roll, ribbon skinCluster, ...)
+    All of it is stored on the reader node, disable_cache_playback() puts the rig back.
+
+    Joints which follow a frozen network but aren't in the cache (e.g. the toe joint under the foot roll)
+    stop following it, bake them as well.
+
+    Parameters
+    ----------
+    path    : str : the .npy cache written by bake_matrices()
+    legs    : list : LegModule instances driving the baked joints
+    name    : str : name of the reader node
+
+    Returns
+    -------
+    reader : str : the bfxMatrixCache node
+    '''
+    plugins.load('matrixCache')
+    _, index = get_matrix_cache(path)
+    joints = index['joints']
+
+    for leg in legs:
+        if leg.toesGuide not in joints:
+            logging.warning('{} is not in {}, it will stop following the foot roll'.format(leg.toesGuide, path))
+
+    reader = mc.createNode('bfxMatrixCache', name=name)
+    mc.setAttr(reader+'.cachePath', path, type='string')
+    mc.connectAttr('time1.outTime', reader+'.time')
+
+    longNames = [mc.ls(jnt, l=1)[0] for jnt in joints]
+    record = {'connections': [], 'ikBlend': {}, 'frozen': []}
+    for i, jnt in enumerate(joints):
+        # Breaking the rig connections, on the compound and child plugs.
+        # We record the source past any unitConversion, connectAttr recreates it when we switch back
+        for attr in ['translate', 'rotate']:
+            for plug in [jnt+'.'+attr] + [jnt+'.'+attr+axis for axis in 'XYZ']:
+                sources = mc.listConnections(plug, s=1, d=0, p=1) or []
+                if not sources:
+                    continue
+                record['connections'].append([mc.listConnections(plug, s=1, d=0, p=1, skipConversionNodes=True)[0], plug])
+                mc.disconnectAttr(sources[0], plug)
+
+        parent = (mc.listRelatives(jnt, p=1, f=1) or [None])[0]
+        if parent in longNames:
+            mc.setAttr(reader+'.parentIndex[{}]'.format(i), longNames.index(parent))
+        else:
+            mc.setAttr(reader+'.parentIndex[{}]'.format(i), -1)
+            mc.connectAttr(jnt+'.parentInverseMatrix[0]', reader+'.parentInverseMatrix[{}]'.format(i))
+        mc.connectAttr(jnt+'.jointOrient', reader+'.jointOrient[{}]'.format(i))
+
+        mc.connectAttr(reader+'.outputTranslate[{}]'.format(i), jnt+'.translate')
+        mc.connectAttr(reader+'.outputRotate[{}]'.format(i), jnt+'.rotate')
+
+    # IkHandles solving any of the baked joints, connected through the start joint message
+    ikHandles = mc.listConnections([jnt+'.message' for jnt in joints], s=0, d=1, type='ikHandle') or []
+    for ikHandle in sorted(set(ikHandles)):
+        record['ikBlend'][ikHandle] = mc.getAttr(ikHandle+'.ikBlend')
+        mc.setAttr(ikHandle+'.ikBlend', 0)
+
+    # Freezing the rig networks, nodes which were already frozen (e.g. a proxy leg's ribbon) stay as they are
+    nodes = get_upstream_network([source for source, _ in record['connections']])
+    for leg in legs:
+        nodes += [node for node in leg.evaluation_nodes() if node not in nodes]
+    for node in nodes:
+        if not mc.getAttr(node+'.frozen'):
+            mc.setAttr(node+'.frozen', True)
+            record['frozen'].append(node)
+
+    mc.addAttr(reader, ln='liveConnections', dt='string')
+    mc.setAttr(reader+'.liveConnections', json.dumps(record), type='string')
+    return reader
+
+def disable_cache_playback(reader='C_matrixCache_MCR'):
+    '''
+    Going back to live rig evaluation: deleting the cache reader and restoring the connections and ikBlend values
+    enable_cache_playback() stored on it. The cache file is closed once no other reader uses it
+
+    Parameters
+    ----------
+    reader  : str : the bfxMatrixCache node
+
+    Returns
+    -------
+    None
+    '''
+    if not mc.objExists(reader):
+        mc.error('{} does not exist'.format(reader))
+
+    record = json.loads(mc.getAttr(reader+'.liveConnections'))
+    path = mc.getAttr(reader+'.cachePath')
+    mc.delete(reader)
+    if path not in [mc.getAttr(elem+'.cachePath') for elem in mc.ls(type='bfxMatrixCache')]:
+        release_matrix_cache(path)
+
+    for source, destination in record['connections']:
+        if not mc.isConnected(source, destination):
+            mc.connectAttr(source, destination, f=1)
+    for ikHandle, ikBlend in record['ikBlend'].items():
+        mc.setAttr(ikHandle+'.ikBlend', ikBlend)
+    for node in record['frozen']:
+        if mc.objExists(node):
+            mc.setAttr(node+'.frozen', False)
+
+def compare_cache_playback(path, legs=(), startFrame=None, endFrame=None):
+    '''
+    Measuring the playback frame rate of the scene on the live rig and on the cache
+
+    Parameters
+    ----------
+    path        : str : the .npy cache written by bake_matrices()
+    legs        : list : LegModule instances driving the baked joints, see enable_cache_playback()
+    startFrame  : int : defaults to the playback start
+    endFrame    : int : defaults to the playback end
+
+    Returns
+    -------
+    report : dict : {'rig': fps, 'cache': fps}
+    '''
+    report = {'rig': profiling.playback_fps(startFrame, endFrame)}
+    reader = enable_cache_playback(path, legs)
+    try:
+        report['cache'] = profiling.playback_fps(startFrame, endFrame)
+    finally:
+        disable_cache_playback(reader)
+
+    logging.info('Cache playback comparison: {}'.format(report))
+    return report
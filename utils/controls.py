@@ -1,4 +1,5 @@
-from maya import cmds as mc
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
 import json
 from BFX_masterclass import static
 
@@ -93,7 +94,7 @@ def build_control_from_json(shapeName, name, parent):
         mc.delete(curve)
         return shape
     # Read the JSON file
-    with open(static.controlShapeFile, 'r') as f:
+    with open(static.settings.controlShapeFile, 'r') as f:
         data = json.load(f)
     
     # Check if the key exists in the JSON data
@@ -137,7 +138,7 @@ def build_masterWalk_control(shapeName, name, parent):
         mc.delete(curve)
         return shape
     # Read the JSON file
-    with open(static.controlShapeFile, 'r') as f:
+    with open(static.settings.controlShapeFile, 'r') as f:
         data = json.load(f)
     
     # Check if the key exists in the JSON data
@@ -1,5 +1,6 @@
-from maya.api import OpenMaya as om
-from maya import cmds as mc
+from BFX_masterclass.utils.lazy import LazyModule
+om = LazyModule('maya.api.OpenMaya')
+mc = LazyModule('maya.cmds')
 
 def get_closest_UV_on_Surface(nrbSurface, position):
     '''
@@ -52,7 +53,7 @@ def rivet_to_surface(nrbSurface, transform, u, v):
 
     Returns
     -------
-    None
+    pointOnSurface : str : the pointOnSurfaceInfo node, we can update the rivet u, v parameters on it
 
     '''
 
@@ -82,6 +83,8 @@ def rivet_to_surface(nrbSurface, transform, u, v):
     mc.connectAttr(localMatrix+'.matrixSum', decomposeMatrix+'.inputMatrix')
     mc.connectAttr(decomposeMatrix+'.outputTranslate', transform+'.translate')
     mc.connectAttr(decomposeMatrix+'.outputRotate', transform+'.rotate')
+
+    return pointOnSurface
     
 def min(name, attribute, value):
     '''
@@ -0,0 +1,215 @@
+'''
+A small build graph for describing a rig build as stages with dependencies, instead of a hand-written script.
+
+A build description is a list of stages:
+    [
+        {'name': 'scene', 'function': pipeline.build_rig_scene, 'parameters': {'assetName': 'CHR_Ellie'}},
+        {'name': 'guides', 'function': read_guides, 'dependencies': ['scene']},
+        {'name': 'L_legPrecompute', 'function': leg_precompute, 'dependencies': ['guides'], 'compute': True},
+        ...
+    ]
+
+Every stage function is called with the results of its dependencies as positional arguments (in the order they are listed),
+followed by its parameters as keyword arguments.
+
+Stages flagged as compute only do maths on the values they receive and never touch the scene,
+so we run them concurrently in a thread pool. Every other stage edits the scene and runs serially on the main thread.
+'''
+from collections import OrderedDict
+from concurrent import futures
+import logging
+import time
+
+
+class Stage:
+    def __init__(self, name, function, dependencies=(), compute=False, parameters=None):
+        self.name=name
+        self.function=function
+        self.dependencies=list(dependencies)
+        self.compute=compute
+        self.parameters=parameters or {}
+
+        self.start=None
+        self.end=None
+
+    @property
+    def duration(self):
+        if self.start is None or self.end is None:
+            return 0.0
+        return self.end - self.start
+
+class BuildGraph:
+    '''
+    Scheduler for a build description.
+
+    Parameters
+    ----------
+    workers     : int : number of threads used for the compute stages. None lets the executor decide
+
+    '''
+    def __init__(self, workers=None):
+        self.workers=workers
+        self.stages=OrderedDict()
+        self.results={}
+
+    @classmethod
+    def from_description(cls, description, workers=None):
+        '''
+        Building a graph from a list of stage dictionaries, see the module docstring for the format
+
+        Returns
+        -------
+        BuildGraph
+        '''
+        graph = cls(workers=workers)
+        for stage in description:
+            graph.add(stage['name'], stage['function'], stage.get('dependencies', ()), stage.get('compute', False), **stage.get('parameters', {}))
+        return graph
+
+    def add(self, name, function, dependencies=(), compute=False, **parameters):
+        '''
+        Adding a stage to our graph
+
+        Parameters
+        ----------
+        name            : str : unique name of the stage
+        function        : callable : function called when we run the stage
+        dependencies    : list : names of the stages we need to run before this one
+        compute         : bool : True if the stage is pure computation and can run off the main thread
+        parameters      : keyword arguments passed to the function
+
+        Returns
+        -------
+        Stage
+        '''
+        if name in self.stages:
+            raise ValueError('Stage "{}" is already part of the build graph'.format(name))
+        self.stages[name] = Stage(name, function, dependencies, compute, parameters)
+        return self.stages[name]
+
+    def order(self):
+        '''
+        Sorting our stages topologically. Stages keep the order they were added in, unless a dependency says otherwise
+
+        Returns
+        -------
+        order : list : stage names
+        '''
+        for stage in self.stages.values():
+            for dependency in stage.dependencies:
+                if dependency not in self.stages:
+                    raise ValueError('Stage "{}" depends on unknown stage "{}"'.format(stage.name, dependency))
+
+        order = []
+        visited = set()
+        while len(order) < len(self.stages):
+            ready = [name for name, stage in self.stages.items() if name not in visited and all(dep in visited for dep in stage.dependencies)]
+            if not ready:
+                cycle = [name for name in self.stages if name not in visited]
+                raise ValueError('Build graph has a dependency cycle between: {}'.format(', '.join(cycle)))
+            order.append(ready[0])
+            visited.add(ready[0])
+
+        return order
+
+    def __run_stage(self, stage, graphStart):
+        stage.start = time.perf_counter() - graphStart
+        result = stage.function(*[self.results[dep] for dep in stage.dependencies], **stage.parameters)
+        stage.end = time.perf_counter() - graphStart
+        return result
+
+    def run(self):
+        '''
+        Running the whole graph.
+
+        Any stage whose dependencies are done is started straight away: compute stages are handed to the thread pool,
+        scene stages are run one at a time on the main thread, in topological order.
+        While a scene stage is running, the compute stages already submitted keep working in the background.
+
+        Returns
+        -------
+        results : dict : {stageName : value returned by the stage function}
+        '''
+        order = self.order()
+        self.results = {}
+        for stage in self.stages.values():
+            stage.start = stage.end = None
+
+        graphStart = time.perf_counter()
+        started = set()
+        running = {}
+        with futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while len(self.results) < len(order):
+                ready = [name for name in order if name not in started and all(dep in self.results for dep in self.stages[name].dependencies)]
+
+                for name in ready:
+                    if self.stages[name].compute:
+                        started.add(name)
+                        running[pool.submit(self.__run_stage, self.stages[name], graphStart)] = name
+
+                sceneStages = [name for name in ready if not self.stages[name].compute]
+                if sceneStages:
+                    name = sceneStages[0]
+                    started.add(name)
+                    logging.info('Running build stage {}'.format(name))
+                    self.results[name] = self.__run_stage(self.stages[name], graphStart)
+                    continue
+
+                if not running:
+                    break
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    logging.info('Finished compute stage {}'.format(name))
+                    self.results[name] = future.result()
+
+        return self.results
+
+    def critical_path(self):
+        '''
+        Finding the chain of dependent stages with the longest total run time in our last run.
+        This is the lower bound of the build time, no matter how many stages we overlap
+
+        Returns
+        -------
+        path    : list : stage names from first to last
+        length  : float : total duration of the path in seconds
+        '''
+        longest = {}
+        previous = {}
+        for name in self.order():
+            stage = self.stages[name]
+            best = max(stage.dependencies, key=lambda dep: longest[dep], default=None)
+            longest[name] = stage.duration + (longest[best] if best else 0.0)
+            previous[name] = best
+
+        if not longest:
+            return [], 0.0
+
+        name = max(longest, key=longest.get)
+        length = longest[name]
+        path = []
+        while name:
+            path.insert(0, name)
+            name = previous[name]
+        return path, length
+
+    def report(self):
+        '''
+        Per stage timings and critical path of the last run, formatted for the script editor
+
+        Returns
+        -------
+        report : str
+        '''
+        lines = ['{:<30}{:<10}{:>10}{:>10}{:>10}'.format('stage', 'kind', 'start', 'end', 'time')]
+        for name in self.order():
+            stage = self.stages[name]
+            if stage.start is None:
+                continue
+            lines.append('{:<30}{:<10}{:>10.3f}{:>10.3f}{:>10.3f}'.format(name, 'compute' if stage.compute else 'scene', stage.start, stage.end, stage.duration))
+
+        path, length = self.critical_path()
+        lines.append('')
+        lines.append('Critical path ({:.3f}s): {}'.format(length, ' > '.join(path)))
+        return '\n'.join(lines)
@@ -0,0 +1,122 @@
+'''
+Small KD-tree over 3D points, in NumPy.
+
+We build it once over a set of points (e.g. mesh vertices) and can then find the closest point to any position
+without comparing it against every point. It doesn't need maya
+'''
+import numpy as np
+
+
+class KDTree:
+    '''
+    Parameters
+    ----------
+    points      : list or numpy.ndarray : (n, 3) positions
+    leafSize    : int : number of points under which we stop splitting, leaves are searched brute force
+
+    '''
+    def __init__(self, points, leafSize=16):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.leafSize = leafSize
+        self.indices = np.arange(len(self.points))
+
+        # Flat node storage, for node i:
+        #   leaf    -> axis[i] == -1, points are self.indices[start[i]:end[i]]
+        #   branch  -> split along axis[i] at split[i], children left[i], right[i]
+        self.axis = []
+        self.split = []
+        self.left = []
+        self.right = []
+        self.start = []
+        self.end = []
+
+        if len(self.points):
+            self.__build(0, len(self.points))
+
+    def __add_node(self, axis, split, start, end):
+        self.axis.append(axis)
+        self.split.append(split)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.start.append(start)
+        self.end.append(end)
+        return len(self.axis) - 1
+
+    def __build(self, start, end):
+        points = self.points[self.indices[start:end]]
+        if end - start <= self.leafSize:
+            return self.__add_node(-1, 0.0, start, end)
+
+        # Splitting along the axis with the biggest spread, at the median point
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        middle = (end - start)//2
+        order = np.argpartition(points[:, axis], middle)
+        self.indices[start:end] = self.indices[start:end][order]
+        split = self.points[self.indices[start+middle], axis]
+
+        node = self.__add_node(axis, split, start, end)
+        self.left[node] = self.__build(start, start+middle)
+        self.right[node] = self.__build(start+middle, end)
+        return node
+
+    def query(self, point, maxDistance=np.inf):
+        '''
+        Finding the closest point to a position
+
+        Parameters
+        ----------
+        point       : list : X, Y, Z coordinates
+        maxDistance : float : we ignore points further away than this
+
+        Returns
+        -------
+        distance    : float : distance to the closest point, inf if there is none within maxDistance
+        index       : int : index of the closest point, -1 if there is none within maxDistance
+        '''
+        if not len(self.points):
+            return np.inf, -1
+
+        point = np.asarray(point, dtype=float)
+        bestDistance = maxDistance*maxDistance
+        bestIndex = -1
+        stack = [(0, 0.0)]
+        while stack:
+            node, boundDistance = stack.pop()
+            if boundDistance > bestDistance:
+                continue
+
+            axis = self.axis[node]
+            if axis == -1:
+                indices = self.indices[self.start[node]:self.end[node]]
+                distances = ((self.points[indices] - point)**2).sum(axis=1)
+                closest = int(np.argmin(distances))
+                if distances[closest] <= bestDistance:
+                    bestDistance = float(distances[closest])
+                    bestIndex = int(indices[closest])
+                continue
+
+            difference = point[axis] - self.split[node]
+            near, far = (self.right[node], self.left[node]) if difference >= 0 else (self.left[node], self.right[node])
+            # Far side first, so we pop the near side next
+            stack.append((far, difference*difference))
+            stack.append((near, 0.0))
+
+        if bestIndex == -1:
+            return np.inf, -1
+        return np.sqrt(bestDistance), bestIndex
+
+    def query_many(self, points, maxDistance=np.inf):
+        '''
+        Finding the closest point for every position
+
+        Returns
+        -------
+        distances   : numpy.ndarray : (n,) inf where there is no point within maxDistance
+        indices     : numpy.ndarray : (n,) -1 where there is no point within maxDistance
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        distances = np.full(len(points), np.inf)
+        indices = np.full(len(points), -1, dtype=int)
+        for i, point in enumerate(points):
+            distances[i], indices[i] = self.query(point, maxDistance)
+        return distances, indices
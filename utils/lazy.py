@@ -0,0 +1,41 @@
+'''
+Lazy module bindings.
+
+Our modules bind maya at the top of the file as usual:
+    mc = LazyModule('maya.cmds')
+    om = LazyModule('maya.api.OpenMaya')
+
+but maya is only imported the first time we call something on it. This way the path logic and the maths
+can be imported by tools running outside of maya (farm schedulers, small tools, tests on plain python),
+and they don't pay for starting maya if they never touch the scene.
+'''
+import importlib
+
+
+class LazyModule:
+    '''
+    Stand-in for a module, which imports the module on the first attribute access
+
+    Parameters
+    ----------
+    name    : str : full name of the module, e.g. 'maya.cmds'
+
+    '''
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __load(self):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, attribute):
+        return getattr(self.__load(), attribute)
+
+    def __dir__(self):
+        return dir(self.__load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__module is not None else 'not loaded'
+        return '<LazyModule {} ({})>'.format(self.__name, state)
@@ -0,0 +1,166 @@
+'''
+Pure vector maths used by the modules.
+
+Nothing in here talks to the scene, so these functions can be called from anywhere:
+while building, when updating a built module from its guides, or outside of maya
+'''
+import numpy as np
+
+
+def distance(start, end):
+    '''
+    Returns the distance between two positions
+
+    Parameters
+    ----------
+    start, end  : list : X, Y, Z coordinates
+
+    Returns
+    -------
+    distance : float
+    '''
+    return float(np.linalg.norm(np.asarray(end, dtype=float) - np.asarray(start, dtype=float)))
+
+def pole_vector_position(hip, knee, ankle):
+    '''
+    Calculating the position of the pole vector.
+
+    We will project the vector between the ankle and knee onto the vector between the hip and ankle.
+    The pole vector will have the same length as the ankle-knee vector and it will be along the vector between the knee projection and knee
+
+    Parameters
+    ----------
+    hip, knee, ankle    : list : world space positions of the guides
+
+    Returns
+    -------
+    position : list : X, Y, Z coordinates of the pole vector
+    '''
+    hip, knee, ankle = (np.asarray(elem, dtype=float) for elem in (hip, knee, ankle))
+
+    hipAnkleVector = ankle - hip
+    ankleKneeVector = knee - ankle
+    kneeProjectionLength = np.dot(hipAnkleVector, ankleKneeVector)/np.linalg.norm(hipAnkleVector)
+    kneeProjectionVector = hipAnkleVector/np.linalg.norm(hipAnkleVector)*kneeProjectionLength
+
+    poleVectorDirection = ankleKneeVector - kneeProjectionVector
+    poleVectorDirection /= np.linalg.norm(poleVectorDirection)
+
+    return (knee + poleVectorDirection*np.linalg.norm(ankleKneeVector)).tolist()
+
+def frame(xAxis, normal):
+    '''
+    Building an orthonormal frame aiming X down xAxis, with Z along the plane normal
+
+    Parameters
+    ----------
+    xAxis   : list : aim direction
+    normal  : list : normal of the plane the frame lies in
+
+    Returns
+    -------
+    numpy.ndarray : 3x3 matrix, one axis per row (maya's row vector convention)
+    '''
+    xAxis = np.asarray(xAxis, dtype=float)
+    xAxis = xAxis/np.linalg.norm(xAxis)
+    zAxis = np.asarray(normal, dtype=float)
+    zAxis = zAxis - xAxis*np.dot(zAxis, xAxis)
+    zAxis /= np.linalg.norm(zAxis)
+    return np.array([xAxis, np.cross(zAxis, xAxis), zAxis])
+
+def two_bone_ik(root, target, pole, upperLength, lowerLength):
+    '''
+    Analytic two bone IK solve.
+
+    The chain lies in the plane defined by the root, the target and the pole.
+    We find the knee with the law of cosines:
+        cos(hipAngle) = (upper^2 + distance^2 - lower^2) / (2 * upper * distance)
+    When the target is out of reach we straighten the chain towards it
+
+    Parameters
+    ----------
+    root, target, pole          : list : world space positions
+    upperLength, lowerLength    : float : world space lengths of the two bones
+
+    Returns
+    -------
+    knee        : numpy.ndarray : world position of the knee
+    hipFrame    : numpy.ndarray : 3x3 frame aiming from the hip to the knee, see frame()
+    kneeFrame   : numpy.ndarray : 3x3 frame aiming from the knee to the end of the chain
+    '''
+    root, target, pole = (np.asarray(elem, dtype=float) for elem in (root, target, pole))
+    a, b = abs(upperLength), abs(lowerLength)
+
+    rootTarget = target - root
+    distance = max(np.linalg.norm(rootTarget), 1e-9)
+    xAxis = rootTarget/distance
+    distance = min(max(distance, abs(a - b)), a + b)
+
+    # Direction from the root/target line towards the pole
+    rootPole = pole - root
+    yAxis = rootPole - xAxis*np.dot(rootPole, xAxis)
+    if np.linalg.norm(yAxis) < 1e-9:
+        yAxis = np.cross(xAxis, [0.0, 0.0, 1.0]) if abs(xAxis[2]) < 0.9 else np.cross(xAxis, [1.0, 0.0, 0.0])
+    yAxis /= np.linalg.norm(yAxis)
+    normal = np.cross(xAxis, yAxis)
+
+    cosHip = np.clip((a*a + distance*distance - b*b)/(2*a*distance), -1.0, 1.0)
+    sinHip = np.sqrt(1.0 - cosHip*cosHip)
+    knee = root + a*(cosHip*xAxis + sinHip*yAxis)
+    end = root + xAxis*distance
+
+    return knee, frame(knee - root, normal), frame(end - knee, normal)
+
+def point_segment_distance(point, start, end):
+    '''
+    Returns the distance between a point and the closest point on the segment between start and end
+
+    Parameters
+    ----------
+    point, start, end   : list : X, Y, Z coordinates
+
+    Returns
+    -------
+    distance : float
+    '''
+    point, start, end = (np.asarray(elem, dtype=float) for elem in (point, start, end))
+    segment = end - start
+    parameter = np.clip(np.dot(point - start, segment)/max(np.dot(segment, segment), 1e-12), 0.0, 1.0)
+    return float(np.linalg.norm(point - (start + segment*parameter)))
+
+def ribbon_surface(frames, spans=4, width=1.0):
+    '''
+    Building the CVs and knots of a degree 3 ribbon surface running through a chain of frames.
+
+    The frame positions are resampled evenly by length into spans+3 rows of CVs (U direction). Each row gets
+    4 CVs spread across the width along the frame's up vector, Y (V direction, one span), with the up vector
+    blended between the frames on either side.
+
+    Parameters
+    ----------
+    frames  : list : 4x4 world matrices (e.g. the surface controls) from the start to the end of the ribbon
+    spans   : int : number of spans along the ribbon
+    width   : float : width of the ribbon along the up vectors
+
+    Returns
+    -------
+    cvs     : numpy.ndarray : (spans+3, 4, 3) CV positions, U major
+    uKnots  : list : knots along the ribbon, in maya's format (no extra end knots)
+    vKnots  : list : knots across the ribbon
+    '''
+    frames = np.asarray(frames, dtype=float).reshape(-1, 4, 4)
+    positions = frames[:, 3, :3]
+    upVectors = frames[:, 1, :3]/np.linalg.norm(frames[:, 1, :3], axis=1)[:, None]
+
+    lengths = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(positions, axis=0), axis=1))])
+    samples = np.linspace(0.0, lengths[-1], spans+3)
+    rowPositions = np.column_stack([np.interp(samples, lengths, positions[:, i]) for i in range(3)])
+    rowUpVectors = np.column_stack([np.interp(samples, lengths, upVectors[:, i]) for i in range(3)])
+    rowUpVectors /= np.linalg.norm(rowUpVectors, axis=1)[:, None]
+
+    offsets = np.linspace(-0.5, 0.5, 4)*width
+    cvs = rowPositions[:, None, :] + offsets[None, :, None]*rowUpVectors[:, None, :]
+
+    uKnots = [0.0]*2 + [float(elem) for elem in range(spans+1)] + [float(spans)]*2
+    vKnots = [0.0]*3 + [1.0]*3
+    return cvs, uKnots, vKnots
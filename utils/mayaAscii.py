@@ -0,0 +1,270 @@
+'''
+Streaming reader for mayaAscii files.
+
+We read a .ma file one statement at a time and only keep the data of the nodes we care about
+(transforms, joints, locators and nurbs surfaces), so we can get to our guides without opening maya
+or importing the whole components scene. Memory stays constant no matter how big the file is,
+the only statement we buffer is the one we are currently reading.
+
+Usage
+-----
+    nodes = read_nodes(pipeline.get_latest_components_file('CHR_Ellie'))
+    guides = read_guides(nodes)
+    print(guides['L_legBind00_LOC'])        # world position
+    print(guides['L_legSurface00_NRB'])     # world space CVs, (cvsU, cvsV, 3)
+'''
+from collections import OrderedDict
+import hashlib
+import logging
+import shlex
+
+import numpy as np
+
+NODE_TYPES = ('transform', 'joint', 'locator', 'nurbsSurface')
+SHAPE_TYPES = ('locator', 'nurbsSurface')
+
+# setAttr flags which are followed by a value
+SETATTR_FLAGS = {'-k', '-keyable', '-l', '-lock', '-cb', '-channelBox', '-s', '-size', '-ch', '-capacityHint',
+    '-type', '-c', '-caching'}
+
+ROTATE_ORDERS = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+# attributes we store for each node: {short name : (key, number of values)}
+ATTRIBUTES = {
+    '.t': ('translate', 3),
+    '.r': ('rotate', 3),
+    '.s': ('scale', 3),
+    '.jo': ('jointOrient', 3),
+    '.ro': ('rotateOrder', 1),
+}
+
+def iter_statements(path):
+    '''
+    Yielding the mel statements of a .ma file one by one, without reading the whole file
+
+    Parameters
+    ----------
+    path    : str : .ma file
+
+    Returns
+    -------
+    generator of str
+    '''
+    statement = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not statement and (not line or line.startswith('//')):
+                continue
+            statement.append(line)
+            if line.endswith(';'):
+                yield ' '.join(statement)[:-1].strip()
+                statement = []
+
+def _parse_create_node(statement):
+    tokens = shlex.split(statement)
+    name = parent = None
+    for i, token in enumerate(tokens):
+        if token in ('-n', '-name'):
+            name = tokens[i+1]
+        elif token in ('-p', '-parent'):
+            parent = tokens[i+1].split('|')[-1]
+    return tokens[1], name, parent
+
+def _parse_set_attr(statement):
+    tokens = statement.split()
+    attribute = dataType = None
+    values = []
+    i = 1
+    while i < len(tokens):
+        token = tokens[i]
+        if token.startswith('-') and not token[1:2].isdigit() and not token[1:2] == '.':
+            if token == '-type':
+                dataType = tokens[i+1].strip('"')
+            i += 2 if token in SETATTR_FLAGS else 1
+            continue
+        if attribute is None:
+            attribute = token.strip('"')
+        else:
+            values.append(token)
+        i += 1
+    return attribute, dataType, values
+
+def _parse_nurbs_surface(values):
+    '''
+    Reading the nurbsSurface data of a .cc setAttr:
+        degreeU degreeV formU formV rational knotCountU knotsU... knotCountV knotsV... cvCount cvs...
+    '''
+    values = [elem for elem in values if elem != '""']
+    degreeU, degreeV = int(values[0]), int(values[1])
+    rational = values[4] == 'yes'
+    index = 5
+    knotCountU = int(values[index])
+    knotsU = np.array(values[index+1:index+1+knotCountU], dtype=float)
+    index += 1 + knotCountU
+    knotCountV = int(values[index])
+    knotsV = np.array(values[index+1:index+1+knotCountV], dtype=float)
+    index += 1 + knotCountV
+    cvCount = int(values[index])
+    stride = 4 if rational else 3
+    cvs = np.array(values[index+1:index+1+cvCount*stride], dtype=float).reshape(cvCount, stride)
+
+    cvsU = knotCountU - degreeU + 1
+    cvsV = knotCountV - degreeV + 1
+    return {
+        'degree': (degreeU, degreeV),
+        'knotsU': knotsU,
+        'knotsV': knotsV,
+        'cvs': cvs[:, :3].reshape(cvsU, cvsV, 3),
+    }
+
+def read_nodes(path, nodeTypes=NODE_TYPES):
+    '''
+    Extracting the nodes of the given types from a .ma file.
+
+    Nodes are keyed by their short name, if a name is not unique in the file the last node wins
+
+    Parameters
+    ----------
+    path        : str : .ma file
+    nodeTypes   : list : node types we are interested in
+
+    Returns
+    -------
+    nodes : OrderedDict : {name : {'type': str, 'parent': str, 'translate': array, 'rotate': array, ...}}
+            rotations are stored in radians, nurbsSurface nodes also get 'degree', 'knotsU', 'knotsV' and 'cvs'
+    '''
+    nodes = OrderedDict()
+    current = None
+    angleScale = np.pi/180.0
+    for statement in iter_statements(path):
+        command = statement.split(' ', 1)[0]
+
+        if command == 'createNode':
+            nodeType, name, parent = _parse_create_node(statement)
+            current = None
+            if nodeType in nodeTypes:
+                if name in nodes:
+                    logging.warning('Node name {} is not unique in {}'.format(name, path))
+                current = nodes[name] = {'type': nodeType, 'parent': parent}
+
+        elif command == 'setAttr' and current is not None:
+            attribute, dataType, values = _parse_set_attr(statement)
+            if attribute in ATTRIBUTES:
+                key, size = ATTRIBUTES[attribute]
+                value = np.array(values[:size], dtype=float)
+                if key in ('rotate', 'jointOrient'):
+                    value *= angleScale
+                current[key] = int(value[0]) if size == 1 else value
+            elif attribute == '.cc' and dataType == 'nurbsSurface':
+                current.update(_parse_nurbs_surface(values))
+
+        elif command == 'currentUnit':
+            tokens = statement.split()
+            if '-a' in tokens:
+                angleScale = 1.0 if tokens[tokens.index('-a')+1].startswith('rad') else np.pi/180.0
+
+        elif command == 'select':
+            # Selecting another node ends the setAttr block of the current node.
+            # Other commands (rename -uid, addAttr, connectAttr, ...) don't change what setAttr applies to
+            current = None
+
+    return nodes
+
+def rotation_matrix(angles, rotateOrder=0):
+    '''
+    Building a 3x3 rotation matrix from euler angles (radians), using maya's row vector convention
+
+    Parameters
+    ----------
+    angles      : list : X, Y, Z rotation
+    rotateOrder : int : index of the rotate order, as stored in the rotateOrder attribute
+
+    Returns
+    -------
+    numpy.ndarray
+    '''
+    matrices = {}
+    for axis, angle in zip('xyz', angles):
+        c, s = np.cos(angle), np.sin(angle)
+        if axis == 'x':
+            matrices[axis] = np.array([[1, 0, 0], [0, c, s], [0, -s, c]])
+        elif axis == 'y':
+            matrices[axis] = np.array([[c, 0, -s], [0, 1, 0], [s, 0, c]])
+        else:
+            matrices[axis] = np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]])
+
+    matrix = np.identity(3)
+    for axis in ROTATE_ORDERS[rotateOrder]:
+        matrix = matrix @ matrices[axis]
+    return matrix
+
+def local_matrix(node):
+    '''
+    Local 4x4 matrix of a transform or joint node: scale * rotate * jointOrient * translate
+    Pivots, shear and rotate axis are ignored, our guides don't use them
+
+    Returns
+    -------
+    numpy.ndarray
+    '''
+    matrix = np.identity(4)
+    rotation = np.diag(node.get('scale', np.ones(3))) @ rotation_matrix(node.get('rotate', np.zeros(3)), node.get('rotateOrder', 0))
+    if 'jointOrient' in node:
+        rotation = rotation @ rotation_matrix(node['jointOrient'])
+    matrix[:3, :3] = rotation
+    matrix[3, :3] = node.get('translate', np.zeros(3))
+    return matrix
+
+def world_matrix(nodes, name):
+    '''
+    World 4x4 matrix of a node, walking up its parents. Shapes return the matrix of their transform
+
+    Returns
+    -------
+    numpy.ndarray
+    '''
+    matrix = np.identity(4)
+    while name in nodes:
+        node = nodes[name]
+        if node['type'] not in SHAPE_TYPES:
+            matrix = matrix @ local_matrix(node)
+        name = node['parent']
+    return matrix
+
+def read_guides(nodes):
+    '''
+    World space guide data from the nodes returned by read_nodes()
+
+    Returns
+    -------
+    guides : dict : {transformName : world position (3,)} for every transform and joint,
+                    {surfaceTransformName : world space CVs (cvsU, cvsV, 3)} for every nurbs surface
+    '''
+    guides = {}
+    for name, node in nodes.items():
+        if node['type'] in ('transform', 'joint'):
+            guides[name] = world_matrix(nodes, name)[3, :3]
+
+    for name, node in nodes.items():
+        if node['type'] == 'nurbsSurface' and 'cvs' in node:
+            matrix = world_matrix(nodes, node['parent'])
+            cvs = node['cvs'] @ matrix[:3, :3] + matrix[3, :3]
+            guides[node['parent'] or name] = cvs
+
+    return guides
+
+def fingerprint(guides):
+    '''
+    Hash of the guide data, it only changes when a guide name or position changes.
+    We can use it to decide if our precomputed or cached data is still valid
+
+    Returns
+    -------
+    str
+    '''
+    digest = hashlib.sha1()
+    for name in sorted(guides):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(guides[name], dtype=np.float64).tobytes())
+    return digest.hexdigest()
@@ -0,0 +1,331 @@
+'''
+Post build optimizer for the rig graph.
+
+Every module builds its own utility nodes, so once all of them are built we are left with work that is evaluated
+more than once or could be evaluated in less nodes:
+    - duplicate nodes: same type, same inputs and same settings (e.g. the twist multMatrix/decomposeMatrix
+      built twice for the knee, or unitConversion nodes created for the same rotation)
+    - multDoubleLinear chains multiplying by constants, which fold into a single node
+    - unitConversion chains, which fold into a single conversion (or none when they cancel out)
+    - multiplyDivide nodes only using their X channel and reading the same input (e.g. masterWalk.scaleY
+      for every leg), which we pack in the Y and Z channels of a single node
+
+None of the passes changes any output value. optimize_rig() can sample poses before and after to prove it
+'''
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+
+import logging
+import random
+
+import numpy as np
+
+from BFX_masterclass.utils import profiling
+
+# Node types we consider for merging. These are all pure functions of their inputs
+MERGE_TYPES = ['multMatrix', 'decomposeMatrix', 'multDoubleLinear', 'multiplyDivide', 'unitConversion',
+    'distanceBetween', 'condition', 'subtract', 'divide', 'max', 'min', 'animBlendNodeAdditiveDA', 'vectorProduct',
+    'fourByFourMatrix', 'pointOnSurfaceInfo']
+
+# Attributes which do not change what the node computes
+IGNORED_ATTRIBUTES = ['isHistoricallyInteresting', 'caching', 'binMembership']
+
+def _freeze(value):
+    # Making getAttr results hashable and ignoring floating point noise
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(elem) for elem in value)
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+def get_inputs(node):
+    '''
+    Returns
+    -------
+    inputs : list : sorted (destinationAttribute, sourcePlug) pairs of all the incoming connections of the node
+    '''
+    connections = mc.listConnections(node, s=1, d=0, c=1, p=1) or []
+    return sorted((connections[i].split('.', 1)[1], connections[i+1]) for i in range(0, len(connections), 2))
+
+def get_outputs(node):
+    '''
+    Returns
+    -------
+    outputs : list : (sourceAttribute, destinationPlug) pairs of all the outgoing connections of the node
+    '''
+    connections = mc.listConnections(node, s=0, d=1, c=1, p=1) or []
+    return [(connections[i].split('.', 1)[1], connections[i+1]) for i in range(0, len(connections), 2)]
+
+def node_signature(node):
+    '''
+    Two nodes with the same signature compute the same values
+
+    Returns
+    -------
+    signature : tuple : (nodeType, inputs, settable attribute values)
+    '''
+    values = []
+    for attribute in mc.listAttr(node, settable=True, multi=True) or []:
+        if attribute in IGNORED_ATTRIBUTES:
+            continue
+        try:
+            values.append((attribute, _freeze(mc.getAttr(node+'.'+attribute))))
+        except (RuntimeError, ValueError):
+            continue
+    return (mc.nodeType(node), tuple(get_inputs(node)), tuple(values))
+
+def reroute_outputs(source, target, attributeMap=None):
+    '''
+    Moving all the outgoing connections of source onto target
+
+    Parameters
+    ----------
+    source          : str : node we are taking the connections from
+    target          : str : node we are connecting from instead
+    attributeMap    : dict : {sourceAttribute : targetAttribute}, attributes not in the map keep their name
+
+    Returns
+    -------
+    None
+    '''
+    attributeMap = attributeMap or {}
+    for attribute, destination in get_outputs(source):
+        mc.connectAttr(target+'.'+attributeMap.get(attribute, attribute), destination, f=1)
+
+def merge_duplicates(nodeTypes=MERGE_TYPES):
+    '''
+    Merging nodes with the same signature. We run until nothing changes, since merging a node can make the nodes downstream identical
+
+    Returns
+    -------
+    merged : int : number of nodes removed
+    '''
+    merged = 0
+    while True:
+        signatures = {}
+        duplicates = []
+        for node in mc.ls(type=nodeTypes) or []:
+            signature = node_signature(node)
+            if signature in signatures:
+                duplicates.append((node, signatures[signature]))
+            else:
+                signatures[signature] = node
+
+        if not duplicates:
+            return merged
+
+        for node, keep in duplicates:
+            reroute_outputs(node, keep)
+            mc.delete(node)
+            merged += 1
+
+def fold_multiply_chains():
+    '''
+    Folding multDoubleLinear nodes multiplying by a constant:
+        - (x * a) * b   -> x * (a*b)
+        - x * 1         -> x
+
+    Returns
+    -------
+    folded : int : number of nodes removed
+    '''
+    def constant(node):
+        if mc.listConnections(node+'.input2', s=1, d=0):
+            return None
+        return mc.getAttr(node+'.input2')
+
+    folded = 0
+    for node in mc.ls(type='multDoubleLinear') or []:
+        if not mc.objExists(node):
+            continue
+        value = constant(node)
+        source = mc.listConnections(node+'.input1', s=1, d=0, p=1)
+        if value is None or not source:
+            continue
+        source = source[0]
+        upstream = source.split('.')[0]
+
+        # x * 1
+        if abs(value - 1.0) < 1e-9:
+            for _, destination in get_outputs(node):
+                mc.connectAttr(source, destination, f=1)
+            mc.delete(node)
+            folded += 1
+            continue
+
+        # (x * a) * b, only if the upstream node isn't used anywhere else
+        if mc.nodeType(upstream) != 'multDoubleLinear' or source != upstream+'.output':
+            continue
+        upstreamValue = constant(upstream)
+        upstreamSource = mc.listConnections(upstream+'.input1', s=1, d=0, p=1)
+        if upstreamValue is None or not upstreamSource or len(get_outputs(upstream)) > 1:
+            continue
+        mc.connectAttr(upstreamSource[0], node+'.input1', f=1)
+        mc.setAttr(node+'.input2', value*upstreamValue)
+        mc.delete(upstream)
+        folded += 1
+
+    return folded
+
+def collapse_unit_conversions():
+    '''
+    Collapsing chains of unitConversion nodes into one conversion: factor = factorA * factorB.
+    When the conversions cancel out we connect the source straight to the destinations
+
+    Returns
+    -------
+    collapsed : int : number of nodes removed
+    '''
+    collapsed = 0
+    for node in mc.ls(type='unitConversion') or []:
+        if not mc.objExists(node):
+            continue
+        upstream = mc.listConnections(node+'.input', s=1, d=0)
+        if not upstream or mc.nodeType(upstream[0]) != 'unitConversion' or len(get_outputs(upstream[0])) > 1:
+            continue
+        upstream = upstream[0]
+        source = mc.listConnections(upstream+'.input', s=1, d=0, p=1)
+        if not source:
+            continue
+
+        factor = mc.getAttr(upstream+'.conversionFactor') * mc.getAttr(node+'.conversionFactor')
+        if abs(factor - 1.0) < 1e-9:
+            for _, destination in get_outputs(node):
+                mc.connectAttr(source[0], destination, f=1)
+            mc.delete(node, upstream)
+            collapsed += 2
+        else:
+            mc.connectAttr(source[0], node+'.input', f=1)
+            mc.setAttr(node+'.conversionFactor', factor)
+            mc.delete(upstream)
+            collapsed += 1
+
+    return collapsed
+
+def pack_multiply_divide():
+    '''
+    Packing multiplyDivide nodes which only use their X channel and share the same input1X source and operation
+    into the Y and Z channels of one node, e.g. the masterWalk.scaleY * lengthRatio node built for every leg
+
+    Returns
+    -------
+    packed : int : number of nodes removed
+    '''
+    def single_channel_source(node):
+        inputs = dict(get_inputs(node))
+        usedChannels = [attribute for attribute in inputs if not attribute.endswith('X')]
+        usedChannels += [attribute for attribute, _ in get_outputs(node) if attribute != 'outputX']
+        if usedChannels or 'input1.input1X' not in inputs and 'input1X' not in inputs:
+            return None
+        return inputs.get('input1.input1X', inputs.get('input1X'))
+
+    groups = {}
+    for node in mc.ls(type='multiplyDivide') or []:
+        source = single_channel_source(node)
+        if source:
+            groups.setdefault((source, mc.getAttr(node+'.operation')), []).append(node)
+
+    packed = 0
+    for (source, _), nodes in groups.items():
+        for i in range(0, len(nodes), 3):
+            keep = nodes[i]
+            for node, axis in zip(nodes[i+1:i+3], 'YZ'):
+                mc.connectAttr(source, keep+'.input1'+axis, f=1)
+                input2 = mc.listConnections(node+'.input2X', s=1, d=0, p=1) or mc.listConnections(node+'.input2.input2X', s=1, d=0, p=1)
+                if input2:
+                    mc.connectAttr(input2[0], keep+'.input2'+axis, f=1)
+                else:
+                    mc.setAttr(keep+'.input2'+axis, mc.getAttr(node+'.input2X'))
+                reroute_outputs(node, keep, {'outputX': 'output'+axis, 'output.outputX': 'output.output'+axis})
+                mc.delete(node)
+                packed += 1
+
+    return packed
+
+def sample_poses(controls, joints, poses=10, seed=0):
+    '''
+    Posing the controls randomly and reading the world matrices of the joints for each pose.
+    The controls are put back to their original values afterwards
+
+    Parameters
+    ----------
+    controls    : list : controls we pose, we only touch their keyable, unlocked and unconnected translate/rotate channels
+    joints      : list : joints we sample
+    poses       : int : number of poses
+    seed        : int : random seed, the same seed gives the same poses
+
+    Returns
+    -------
+    samples : numpy.ndarray : (poses, joints, 16)
+    '''
+    channels = []
+    for ctl in controls:
+        for attribute in ['translateX', 'translateY', 'translateZ', 'rotateX', 'rotateY', 'rotateZ']:
+            plug = ctl+'.'+attribute
+            if mc.getAttr(plug, k=1) and not mc.getAttr(plug, l=1) and not mc.listConnections(plug, s=1, d=0):
+                channels.append((plug, mc.getAttr(plug)))
+
+    generator = random.Random(seed)
+    samples = np.zeros((poses, len(joints), 16))
+    try:
+        for pose in range(poses):
+            for plug, _ in channels:
+                amount = 30.0 if '.rotate' in plug else 1.0
+                mc.setAttr(plug, generator.uniform(-amount, amount))
+            for i, jnt in enumerate(joints):
+                samples[pose, i] = mc.xform(jnt, q=1, ws=1, m=1)
+    finally:
+        for plug, value in channels:
+            mc.setAttr(plug, value)
+
+    return samples
+
+def optimize_rig(verify=False, controls=None, joints=None, poses=10, tolerance=1e-4):
+    '''
+    Running all the optimization passes over the scene, once all our modules are built
+
+    Parameters
+    ----------
+    verify      : bool : sample poses before and after the passes and compare the joint matrices,
+                        the passes are undone if they don't match
+    controls    : list : controls posed during verification, defaults to all the *_CTL transforms
+    joints      : list : joints compared during verification, defaults to all the joints
+    poses       : int : number of poses to sample
+    tolerance   : float : maximum difference allowed between the matrices before and after
+
+    Returns
+    -------
+    report : dict : {'before': int, 'after': int, 'merged': int, 'folded': int, 'unitConversions': int, 'packed': int,
+                    'maxError': float (only when verifying)}
+    '''
+    if verify:
+        controls = controls or mc.ls('*_CTL', type='transform')
+        joints = joints or mc.ls(type='joint')
+        before = sample_poses(controls, joints, poses)
+
+    # The passes go in a single undo chunk, so we can roll them back if the optimized rig doesn't match
+    undoState = mc.undoInfo(q=1, state=1)
+    mc.undoInfo(state=True)
+    mc.undoInfo(openChunk=True, chunkName='optimize_rig')
+    try:
+        report = {'before': sum(profiling.count_nodes().values())}
+        report['packed'] = pack_multiply_divide()
+        report['folded'] = fold_multiply_chains()
+        report['unitConversions'] = collapse_unit_conversions()
+        report['merged'] = merge_duplicates()
+        report['after'] = sum(profiling.count_nodes().values())
+
+        if verify:
+            after = sample_poses(controls, joints, poses)
+            report['maxError'] = float(np.abs(after - before).max()) if before.size else 0.0
+    finally:
+        mc.undoInfo(closeChunk=True)
+
+    if verify and report['maxError'] > tolerance:
+        mc.undo()
+        mc.undoInfo(state=undoState)
+        mc.error('Optimized rig does not match the original rig, max error {}, the optimization has been undone'.format(report['maxError']))
+    mc.undoInfo(state=undoState)
+
+    logging.info('Rig optimized from {} to {} nodes'.format(report['before'], report['after']))
+    return report
@@ -1,7 +1,8 @@
 import os
 
-from maya import cmds as mc
-from maya import OpenMaya as om
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+om = LazyModule('maya.OpenMaya')
 
 from BFX_masterclass.utils import controls as ctlFn
 from BFX_masterclass import static
@@ -30,10 +31,8 @@ def build_rig_scene(assetName):
     mc.file(new=1, f=1)
 
     # Import model
-    path = '/'.join([static.project, assetName, 'modeling'])
-    modelFile = os.listdir(path)
-    modelFile.sort()
-    mc.file('/'.join([path, modelFile[-1]]), i= True, type= "mayaAscii", usingNamespaces= False, f=True)  
+    path = '/'.join([static.settings.project, assetName, 'modeling'])
+    mc.file(get_latest_file(path), i= True, type= "mayaAscii", usingNamespaces= False, f=True)  
 
     # Create our hierarchy
     characterGroup = mc.createNode('transform', name=static.characterGroup)
@@ -49,17 +48,49 @@ def build_rig_scene(assetName):
         mc.parent(grp, masterWalkCtl)
 
     # Import components file
-    path = '/'.join([static.project, assetName, 'rigging', 'components'])
+    path = '/'.join([static.settings.project, assetName, 'rigging', 'components'])
     if not os.path.exists(path):
         os.makedirs(path)
         return
-    componentsFile = os.listdir(path)
-    if len(componentsFile)>0:
-            
-        componentsFile.sort()
-        mc.file('/'.join([path, componentsFile[-1]]), i= True, type= "mayaAscii", usingNamespaces= False, f=True) 
+    componentsFile = get_latest_file(path)
+    if componentsFile:
+        mc.file(componentsFile, i= True, type= "mayaAscii", usingNamespaces= False, f=True) 
     
 
+def get_latest_file(path):
+    '''
+    Returns the latest version of the files in a folder. Our files are versioned in their name, so the latest file is the last one alphabetically
+
+    Parameters
+    ----------
+    path    : str : folder we are searching in
+
+    Returns
+    -------
+    str : full path to the latest file, None if the folder is empty
+    '''
+    files = sorted(os.listdir(path))
+    if not files:
+        return None
+    return '/'.join([path, files[-1]])
+
+def get_latest_components_file(assetName):
+    '''
+    Returns the latest rig components file of an asset. We can read it with utils.mayaAscii without importing it
+
+    Parameters
+    ----------
+    assetName   : str : name of the asset, e.g. CHR_Ellie
+
+    Returns
+    -------
+    str : full path to the components file, None if there is none
+    '''
+    path = '/'.join([static.settings.project, assetName, 'rigging', 'components'])
+    if not os.path.exists(path):
+        return None
+    return get_latest_file(path)
+
 def get_boundingBox(object):
     bbx = mc.exactWorldBoundingBox(object)
 
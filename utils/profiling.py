@@ -0,0 +1,61 @@
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+
+from collections import Counter
+import time
+
+
+def count_nodes(nodes=None):
+    '''
+    Counting the dependency nodes in the scene per node type
+
+    Parameters
+    ----------
+    nodes   : list : nodes we want to count, defaults to every node in the scene
+
+    Returns
+    -------
+    Counter : {nodeType : count}, sum(counter.values()) gives us the total
+    '''
+    if nodes is None:
+        nodes = mc.ls()
+    return Counter(mc.nodeType(node) for node in nodes)
+
+def playback_fps(startFrame=None, endFrame=None, loops=1):
+    '''
+    Measuring how many frames per second the scene evaluates at, by stepping through the frame range
+    and forcing an update on every frame
+
+    Parameters
+    ----------
+    startFrame  : int : defaults to the playback start
+    endFrame    : int : defaults to the playback end
+    loops       : int : number of times we play the range, the first loop also pays for the cache warm up
+
+    Returns
+    -------
+    fps : float
+    '''
+    if startFrame is None:
+        startFrame = int(mc.playbackOptions(q=1, min=1))
+    if endFrame is None:
+        endFrame = int(mc.playbackOptions(q=1, max=1))
+
+    currentFrame = mc.currentTime(q=1)
+    frames = range(int(startFrame), int(endFrame)+1)
+    start = time.perf_counter()
+    for _ in range(loops):
+        for frame in frames:
+            mc.currentTime(frame, update=True)
+    duration = time.perf_counter() - start
+    mc.currentTime(currentFrame)
+
+    return len(frames)*loops/duration
+
+def memory_usage():
+    '''
+    Returns
+    -------
+    memory : float : memory used by maya's heap in megabytes
+    '''
+    return mc.memory(heapMemory=True, megaByte=True)
@@ -0,0 +1,223 @@
+'''
+Skinning tools.
+
+mirror_weights() mirrors the skin weights of one side of a mesh to the other:
+    1. We build a KD-tree over the vertex positions once and find the mirrored counterpart of every vertex,
+       within a tolerance, so the model doesn't need to be perfectly symmetric
+    2. The vertex map only depends on the topology, so we cache it and the next mirror on the same mesh skips step 1
+    3. Influences are swapped between sides by name, L_ <-> R_ (e.g. L_legBind03_JNT -> R_legBind03_JNT)
+    4. All the mirrored weights are read and written in one call each through MFnSkinCluster
+'''
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+om = LazyModule('maya.api.OpenMaya')
+oma = LazyModule('maya.api.OpenMayaAnim')
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from BFX_masterclass.utils.kdtree import KDTree
+
+AXES = 'xyz'
+
+# {topology key : vertex map}
+_MIRROR_MAPS = {}
+
+def mirror_name(name, sides=('L_', 'R_')):
+    '''
+    Returns the name of the influence on the other side, names without a side prefix mirror onto themselves
+
+    Parameters
+    ----------
+    name    : str : influence name, can include a namespace or dag path
+    sides   : list : the two side prefixes
+
+    Returns
+    -------
+    str
+    '''
+    shortName = name.split('|')[-1]
+    namespace, _, baseName = shortName.rpartition(':')
+    for side, otherSide in [sides, sides[::-1]]:
+        if baseName.startswith(side):
+            baseName = otherSide + baseName[len(side):]
+            break
+    return namespace + ':' + baseName if namespace else baseName
+
+def build_mirror_map(points, axis='x', tolerance=0.001):
+    '''
+    Finding the mirrored counterpart of every point
+
+    Parameters
+    ----------
+    points      : numpy.ndarray : (n, 3) positions
+    axis        : str : axis we mirror across
+    tolerance   : float : max distance between a mirrored point and its counterpart
+
+    Returns
+    -------
+    vertexMap : numpy.ndarray : (n,) index of the counterpart of each point, -1 when we couldn't find one
+    '''
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    mirrored = points.copy()
+    mirrored[:, AXES.index(axis)] *= -1
+    _, vertexMap = KDTree(points).query_many(mirrored, tolerance)
+    return vertexMap
+
+def get_skin_cluster(mesh):
+    '''
+    Returns
+    -------
+    str : the skinCluster deforming the mesh
+    '''
+    skinClusters = mc.ls(mc.listHistory(mesh), type='skinCluster')
+    if not skinClusters:
+        mc.error('{} has no skinCluster'.format(mesh))
+    return skinClusters[0]
+
+def get_undeformed_points(mesh):
+    '''
+    World space vertex positions of the mesh before deformation, so the current pose of the rig doesn't matter.
+    We read them from the original (intermediate) shape the deformers start from
+
+    Parameters
+    ----------
+    mesh    : str : skinned mesh transform or shape
+
+    Returns
+    -------
+    points : numpy.ndarray : (n, 3)
+    '''
+    transform = mesh if mc.nodeType(mesh) == 'transform' else mc.listRelatives(mesh, p=1, f=1)[0]
+    shapes = mc.listRelatives(transform, s=1, f=1, type='mesh') or []
+    origShapes = [elem for elem in shapes if mc.getAttr(elem+'.intermediateObject') and not mc.listConnections(elem+'.inMesh', s=1, d=0)]
+    if not origShapes:
+        mc.error('{} has no original shape to read the undeformed points from'.format(mesh))
+
+    selection_list = om.MSelectionList()
+    selection_list.add(origShapes[0])
+    points = om.MFnMesh(selection_list.getDagPath(0)).getPoints(om.MSpace.kWorld)
+    return np.array([[point.x, point.y, point.z] for point in points])
+
+def get_topology_key(mesh, axis, tolerance):
+    '''
+    Hash of the mesh topology (polygon vertex counts and ids) and the mirror settings, we cache our vertex maps with it
+
+    Returns
+    -------
+    str
+    '''
+    selection_list = om.MSelectionList()
+    selection_list.add(mesh)
+    counts, connects = om.MFnMesh(selection_list.getDagPath(0)).getVertices()
+
+    digest = hashlib.sha1()
+    digest.update(np.array(counts, dtype=np.int32).tobytes())
+    digest.update(np.array(connects, dtype=np.int32).tobytes())
+    # 'orig': maps built from the undeformed points, older maps cached from posed points don't match this key
+    digest.update('{}{}orig'.format(axis, tolerance).encode())
+    return digest.hexdigest()
+
+def get_mirror_map(mesh, axis='x', tolerance=0.001, cacheFolder=None):
+    '''
+    Returns the vertex map of a mesh, from the cache when we already have it
+
+    Parameters
+    ----------
+    mesh        : str : mesh transform or shape
+    axis        : str : axis we mirror across
+    tolerance   : float : max distance between a mirrored vertex and its counterpart
+    cacheFolder : str : optional folder where we also store the maps as .npy files, so they survive between sessions
+
+    Returns
+    -------
+    vertexMap : numpy.ndarray
+    '''
+    key = get_topology_key(mesh, axis, tolerance)
+    if key in _MIRROR_MAPS:
+        return _MIRROR_MAPS[key]
+
+    cacheFile = os.path.join(cacheFolder, key+'.npy') if cacheFolder else None
+    if cacheFile and os.path.exists(cacheFile):
+        _MIRROR_MAPS[key] = np.load(cacheFile)
+        return _MIRROR_MAPS[key]
+
+    vertexMap = build_mirror_map(get_undeformed_points(mesh), axis, tolerance)
+    unmatched = int((vertexMap == -1).sum())
+    if unmatched:
+        logging.warning('{} vertices of {} have no mirrored counterpart within {}'.format(unmatched, mesh, tolerance))
+
+    _MIRROR_MAPS[key] = vertexMap
+    if cacheFile:
+        if not os.path.exists(cacheFolder):
+            os.makedirs(cacheFolder)
+        np.save(cacheFile, vertexMap)
+    return vertexMap
+
+def mirror_weights(mesh, axis='x', positiveToNegative=True, tolerance=0.001, sides=('L_', 'R_'), cacheFolder=None):
+    '''
+    Mirroring the skin weights of a mesh from one side to the other.
+
+    Vertices on the center line and vertices without a counterpart keep their weights
+
+    Parameters
+    ----------
+    mesh                : str : skinned mesh
+    axis                : str : axis we mirror across
+    positiveToNegative  : bool : copy the weights from the positive side onto the negative side, or the other way round
+    tolerance           : float : max distance between a mirrored vertex and its counterpart
+    sides               : list : the two side prefixes of our influence names
+    cacheFolder         : str : optional folder for the vertex map cache, see get_mirror_map()
+
+    Returns
+    -------
+    mirrored : int : number of vertices we wrote weights to
+    '''
+    skinCluster = get_skin_cluster(mesh)
+    vertexMap = get_mirror_map(mesh, axis, tolerance, cacheFolder)
+
+    # Making sure every mirrored influence is part of the skinCluster, locked until we have written the weights
+    influences = mc.skinCluster(skinCluster, q=1, inf=1)
+    addedInfluences = []
+    for influence in influences:
+        mirrored = mirror_name(influence, sides)
+        if mirrored not in influences and mirrored not in addedInfluences and mc.objExists(mirrored):
+            mc.skinCluster(skinCluster, e=1, ai=mirrored, lw=1, wt=0)
+            addedInfluences.append(mirrored)
+
+    selection_list = om.MSelectionList()
+    selection_list.add(mesh)
+    selection_list.add(skinCluster)
+    meshDagPath = selection_list.getDagPath(0)
+    skinFn = oma.MFnSkinCluster(selection_list.getDependNode(1))
+
+    influencePaths = skinFn.influenceObjects()
+    influenceNames = [influencePaths[i].partialPathName() for i in range(len(influencePaths))]
+    influenceIndex = dict((name, i) for i, name in enumerate(influenceNames))
+    influenceMap = np.array([influenceIndex.get(mirror_name(name, sides), i) for i, name in enumerate(influenceNames)])
+
+    components = om.MFnSingleIndexedComponent().create(om.MFn.kMeshVertComponent)
+    om.MFnSingleIndexedComponent(components).setCompleteData(len(vertexMap))
+    weights, influenceCount = skinFn.getWeights(meshDagPath, components)
+    weights = np.array(weights).reshape(-1, influenceCount)
+
+    # Vertices on the destination side, which have a counterpart
+    points = get_undeformed_points(mesh)[:, AXES.index(axis)]
+    destination = (points < -tolerance) if positiveToNegative else (points > tolerance)
+    destination &= vertexMap != -1
+
+    mirroredWeights = weights.copy()
+    sourceWeights = weights[vertexMap[destination]]
+    mirroredWeights[destination] = 0.0
+    for i in range(influenceCount):
+        mirroredWeights[destination, influenceMap[i]] += sourceWeights[:, i]
+
+    influenceIndices = om.MIntArray(list(range(influenceCount)))
+    skinFn.setWeights(meshDagPath, components, influenceIndices, om.MDoubleArray(mirroredWeights.flatten().tolist()), False)
+    for influence in addedInfluences:
+        mc.skinCluster(skinCluster, e=1, inf=influence, lw=0)
+
+    return int(destination.sum())
@@ -0,0 +1,155 @@
+'''
+Rig templates, for when we need many copies of the same character (crowds, previs).
+
+Instead of running the whole build for every copy, we build the rig once, capture its node network
+to a file and stamp out instances by importing that file under a unique namespace each time.
+Every instance is a full copy of the network, so they animate independently of each other.
+
+Usage
+-----
+    template = RigTemplate(lambda: BuildGraph.from_description(Ellie.BUILD).run())
+    template.capture()
+    instances = template.stamp(20, offsets=[[i*100, 0, 0] for i in range(20)])
+    print(template.report())
+'''
+from BFX_masterclass.utils.lazy import LazyModule
+mc = LazyModule('maya.cmds')
+
+import json
+import os
+import tempfile
+import time
+
+from BFX_masterclass.utils import profiling
+from BFX_masterclass import plugins, static
+
+
+class RigTemplate:
+    '''
+    Parameters
+    ----------
+    build       : callable : builds the rig in the current scene
+    path        : str : file we capture the rig to, defaults to a mayaBinary file in the temp folder
+    rootNode    : str : top node of the rig, we export everything under it and its upstream network
+
+    '''
+    def __init__(self, build, path=None, rootNode=static.characterGroup):
+        self.build=build
+        self.path=path or os.path.join(tempfile.gettempdir(), 'BFX_rigTemplate.mb').replace('\\', '/')
+        self.rootNode=rootNode
+
+        self.buildTime=None
+        self.buildMemory=None
+        self.instances=[]
+
+    def capture(self, newScene=True, force=False):
+        '''
+        Building the rig once and exporting its node network to our template file.
+        The rig is built in a new scene, so we refuse to run when the open scene has unsaved changes, unless forced.
+
+        The plugins whose nodes the rig uses are stored next to the template (path.json), stamp() loads them
+
+        Parameters
+        ----------
+        newScene    : bool : start a new scene once we have captured the rig
+        force       : bool : discard the unsaved changes of the open scene
+
+        Returns
+        -------
+        path : str : the template file
+        '''
+        if mc.file(q=1, modified=1) and not force:
+            mc.error('The open scene has unsaved changes, save it or capture with force=True')
+
+        mc.file(new=1, f=1)
+        memory = profiling.memory_usage()
+        start = time.perf_counter()
+        self.build()
+        self.buildTime = time.perf_counter() - start
+        self.buildMemory = profiling.memory_usage() - memory
+
+        mc.select(self.rootNode)
+        mc.file(self.path, exportSelected=True, type='mayaBinary', force=True, constructionHistory=True,
+            channels=True, constraints=True, expressions=True, preserveReferences=False)
+        mc.select(cl=1)
+
+        usedPlugins = [name for name in plugins.available() if mc.pluginInfo(name, q=1, loaded=1)
+            and mc.ls(type=mc.pluginInfo(name, q=1, dependNode=1) or [])]
+        with open(self.path+'.json', 'w') as f:
+            json.dump({'plugins': usedPlugins}, f, indent=4)
+
+        if newScene:
+            mc.file(new=1, f=1)
+        return self.path
+
+    def stamp(self, count, offsets=None, prefix='instance'):
+        '''
+        Importing count instances of the captured rig into the current scene.
+        Viewport refresh is suspended while we import, we only pay for the file reads
+
+        Parameters
+        ----------
+        count   : int : number of instances
+        offsets : list : [x, y, z] root offset for each instance, applied to the root node
+        prefix  : str : namespace prefix, instances get prefix01, prefix02, ...
+
+        Returns
+        -------
+        namespaces : list : namespace of each new instance
+        '''
+        if not os.path.exists(self.path):
+            mc.error('Rig template {} has not been captured yet'.format(self.path))
+
+        # Our plugin nodes would be imported as unknown nodes in a session where the plugins aren't loaded yet
+        usedPlugins = plugins.available()
+        if os.path.exists(self.path+'.json'):
+            with open(self.path+'.json', 'r') as f:
+                usedPlugins = json.load(f)['plugins']
+        for name in usedPlugins:
+            plugins.load(name)
+
+        namespaces = []
+        mc.refresh(suspend=True)
+        try:
+            for i in range(count):
+                index = len(self.instances)+1
+                namespace = '{}{:02d}'.format(prefix, index)
+                while mc.namespace(exists=namespace):
+                    index += 1
+                    namespace = '{}{:02d}'.format(prefix, index)
+
+                memory = profiling.memory_usage()
+                start = time.perf_counter()
+                mc.file(self.path, i=True, type='mayaBinary', namespace=namespace, preserveReferences=False)
+                if offsets:
+                    mc.setAttr(namespace+':'+self.rootNode+'.translate', *offsets[i])
+
+                self.instances.append({
+                    'namespace': namespace,
+                    'time': time.perf_counter() - start,
+                    'memory': profiling.memory_usage() - memory,
+                })
+                namespaces.append(namespace)
+        finally:
+            mc.refresh(suspend=False)
+
+        return namespaces
+
+    def report(self):
+        '''
+        Time and memory per instance compared to building the rig, formatted for the script editor
+
+        Returns
+        -------
+        report : str
+        '''
+        lines = ['{:<20}{:>12}{:>14}'.format('', 'time (s)', 'memory (MB)')]
+        if self.buildTime is not None:
+            lines.append('{:<20}{:>12.3f}{:>14.1f}'.format('full build', self.buildTime, self.buildMemory))
+        for instance in self.instances:
+            lines.append('{:<20}{:>12.3f}{:>14.1f}'.format(instance['namespace'], instance['time'], instance['memory']))
+        if self.instances:
+            averageTime = sum(elem['time'] for elem in self.instances)/len(self.instances)
+            averageMemory = sum(elem['memory'] for elem in self.instances)/len(self.instances)
+            lines.append('{:<20}{:>12.3f}{:>14.1f}'.format('instance average', averageTime, averageMemory))
+        return '\n'.join(lines)